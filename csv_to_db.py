@@ -1,37 +1,127 @@
 import pandas as pd
+import polars as pl
 from sqlalchemy import create_engine
+import argparse
+import datetime
+import glob
+import hashlib
+import io
 import os
-from multiprocessing import Pool
+import shutil
+import sqlite3
+from multiprocessing import Pool, Queue, cpu_count
+from queue import Empty
 
-# Load the CSV file into a DataFrame
-df = pd.read_csv('data/performance_evaluation_table.csv')
+from modules.SQL_Queries import report_columns, text_columns
 
-# Create a copy of the DataFrame before making changes
-df_before = df.copy()
+# Size of the byte ranges handed to each parser process, and how many parsed
+# chunks may wait for the writer before the parsers block
+segment_bytes = 64 * 1024 * 1024
+queue_size = 4
 
-# Convert all strings in column 1 to uppercase
-df.iloc[:, 1] = df.iloc[:, 1].astype(str).str.upper()
+# Indexes for every access path in modules/SQL_Queries.py: each report filters
+# Retail_Table on the bank and year plus one geography, and resolves names in bank.
+# State and county codes are compared as integers, so that index is on the same
+# expressions as the query. The tract indexes serve lookups by MSA/MD code or
+# (state, county) in any vintage.
+indexes = {
+    'idx_retail_bank_year_md': ('Retail_Table', ['id_rssd', 'ActivityYear', 'MD_Code']),
+    'idx_retail_bank_year_msa': ('Retail_Table', ['id_rssd', 'ActivityYear', 'MSA_Code']),
+    'idx_retail_bank_year_county_int': ('Retail_Table', ['id_rssd', 'ActivityYear', 'CAST(State_Code AS INTEGER)', 'CAST(County_Code AS INTEGER)']),
+    'idx_retail_year_bank': ('Retail_Table', ['ActivityYear', 'id_rssd']),
+    'idx_bank_name': ('bank', ['bank_name', 'id_rssd']),
+    'idx_tract_area': ('tract', ['MSA/MD code', 'vintage']),
+    'idx_tract_county': ('tract', ['State code', 'County code', 'vintage']),
+}
+
+# Indexes no query can use any more, dropped when the indexes are built
+retired_indexes = ['idx_retail_bank_year_county']
+
+# Physical order of Retail_Table when clustering: every report reads one bank-year,
+# so keeping those rows together means a fetch touches a few contiguous pages
+cluster_key = ['id_rssd', 'ActivityYear', 'MD_Code', 'MSA_Code', 'State_Code', 'County_Code']
+
+# Parquet target: zstd files under parquet/<table>/
+parquet_root = 'parquet'
 
-# Replace standalone "AND" with "&"
-df.iloc[:, 1] = df.iloc[:, 1].str.replace(r"\bAND\b", "&")
+# Report families served from pre-summed agg_<report> tables: one row per bank, year and
+# assessment area. Each lookup method groups Retail_Table rows by the key
+# SQL_Queries.area_key builds for it, over the rows that carry such a code.
+aggregate_reports = [report for report in report_columns if report != 'overall']
+area_groupings = {
+    'md': ("MD_Code", "MD_Code NOT IN ('NA', '')"),
+    'msa': ("MSA_Code", "MSA_Code NOT IN ('NA', '')"),
+    'state_county': (
+        "CAST(State_Code AS INTEGER) || ',' || CAST(County_Code AS INTEGER)",
+        "CAST(State_Code AS INTEGER) > 0 AND CAST(County_Code AS INTEGER) > 0"
+    )
+}
+
+# Tables split by year. The Parquet target writes them as <column>=<year> directories so a
+# report only opens the year it needs, and delta loads (--years) replace only those years.
+year_columns = {'Retail_Table': 'ActivityYear', 'bank_catalog': 'ActivityYear', **{f'agg_{report}': 'ActivityYear' for report in aggregate_reports}}
 
-# Sort by 'id_rssd' and 'exam_year' in descending order
-df.sort_values(by=['id_rssd', 'exam_year'], ascending=[True, False], inplace=True)
+# Checkpoints for resumable loads, kept in the database itself so a chunk and its
+# manifest row always commit in the same transaction. Offsets are byte offsets into the
+# CSV for the pandas engine and row offsets for the polars engine. delta_years lists the
+# years delta loads have replaced, for a table that also holds rows from earlier files.
+manifest_tables = [
+    '''CREATE TABLE IF NOT EXISTS load_files (
+        table_name TEXT PRIMARY KEY,
+        source_file TEXT,
+        source_hash TEXT,
+        engine TEXT,
+        completed_at TEXT,
+        delta_years TEXT
+    )''',
+    '''CREATE TABLE IF NOT EXISTS load_manifest (
+        table_name TEXT,
+        source_hash TEXT,
+        chunk_no INTEGER,
+        start_offset INTEGER,
+        end_offset INTEGER,
+        rows INTEGER,
+        committed_at TEXT,
+        PRIMARY KEY (table_name, source_hash, chunk_no)
+    )''',
+]
 
-# Replace 'bank_name' with the 'bank_name' of the latest 'exam_year' in each 'id_rssd' group
-df['bank_name'] = df.groupby('id_rssd')['bank_name'].transform('first')
+# Python type of a cell for each SQLite storage class, as named in the dtype report
+python_types = {
+    'integer': "<class 'int'>",
+    'real': "<class 'float'>",
+    'text': "<class 'str'>",
+    'blob': "<class 'bytes'>",
+    'null': "<class 'NoneType'>",
+}
 
-# Reset index for both DataFrames
-df.reset_index(drop=True, inplace=True)
-df_before.reset_index(drop=True, inplace=True)
+# Polars engine: rows sampled to infer the types of columns not listed in column_types,
+# and rows per batch handed to the writer (one transaction and manifest row each, or one
+# Parquet write per partition). The streaming engine's own batches are far smaller.
+infer_schema_rows = 100000
+batch_rows = 150000
 
-# Compare the two DataFrames and print the changes
-changes = df_before[df_before['bank_name'] != df['bank_name']]
-for index, row in changes.iterrows():
-    print(f"Changed name from {df_before.loc[index, 'bank_name']} to {row['bank_name']} for id_rssd {row['id_rssd']}")
+# Bulk load mode: trade durability for speed while the database is being rebuilt.
+# WAL keeps a crashed load from corrupting the file; fsyncs are skipped until the end.
+bulk_batch_chunks = 8  # chunks committed per transaction
+bulk_load_pragmas = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=OFF',
+    'PRAGMA cache_size=-1048576',  # 1GB page cache
+    'PRAGMA temp_store=MEMORY',
+]
+safe_pragmas = [
+    'PRAGMA wal_checkpoint(TRUNCATE)',
+    'PRAGMA journal_mode=DELETE',
+    'PRAGMA synchronous=FULL',
+]
 
-# Save the DataFrame back to the CSV file
-df.to_csv('data/performance_evaluation_table.csv', index=False)
+# Crosswalk sheets in data/MSA_state_county_tract.xlsx and the vintage their rows are
+# stored under in the tract table, newest first
+tract_sheets = {
+    '2024 tracts': '2024',
+    '2022-2023 tracts': '2022-2023'
+}
 
 # Define the column types for each CSV file
 column_types = {
@@ -44,12 +134,7 @@ column_types = {
         'int': [],
         'date': ['mort_eval_period_start', 'mort_eval_period_end', 'cra_eval_period_start', 'cra_eval_period_end', 'cd_eval_period_start', 'cd_eval_period_end', 'consumer_eval_period_start', 'consumer_eval_period_end', 'exam_start_date']
     },
-    '2024_tracts': {
-        'string': ['Year', 'MSA/MD code type', 'MSA/MD code', 'State code', 'County code', 'Tract', 'MSA/MD name', 'State', 'County name', 'FIPS code', 'MSA/MD MFI', 'Tract MFI', 'Tract income percentage', 'Tract income level'],
-        'int': [],
-        'date': []
-    },
-    '2022_2023_tracts': {
+    'tract': {
         'string': ['Year', 'MSA/MD code type', 'MSA/MD code', 'State code', 'County code', 'Tract', 'MSA/MD name', 'State', 'County name', 'FIPS code', 'MSA/MD MFI', 'Tract MFI', 'Tract income percentage', 'Tract income level'],
         'int': [],
         'date': []
@@ -57,91 +142,814 @@ column_types = {
 }
 
 
-def process_csv(csv_file):
-    # Create a connection engine to the SQLite database
-    engine = create_engine('sqlite:///my_database.db')
+def convert_types(df, types, date_format=None):
+    # Convert the columns to the correct types
+    for col in types['string']:
+        df[col] = df[col].fillna('NA').astype(str)  # Ensure 'NA' is treated as string
+    for col in types['int']:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)  # 'NA' becomes 0
+    for col in types.get('date', []):
+        df[col] = pd.to_datetime(df[col], format=date_format, errors='coerce')  # Convert to datetime
+        df[col] = df[col].fillna(pd.Timestamp.min)  # Handle 'NA' in date columns, setting to a minimum date
+        df[col] = df[col].dt.strftime('%m/%d/%Y')  # Format dates as MM/DD/YYYY
+    return df
+
+def plan_segments(csv_file):
+    # Split the body of the CSV into byte ranges that start and end on line boundaries,
+    # so each range can be parsed on its own. Assumes no newlines inside quoted fields,
+    # which holds for the Fed and FFIEC files.
+    segments = []
+    with open(csv_file, 'rb') as f:
+        f.readline()  # Skip the header
+        start = f.tell()
+        size = os.fstat(f.fileno()).st_size
+        while start < size:
+            f.seek(min(start + segment_bytes, size))
+            f.readline()  # Move to the end of the current line
+            end = f.tell()
+            segments.append((start, end))
+            start = end
+    return segments
+
+def read_segment(csv_file, table_name, start, end):
+    # Read one byte range of the CSV, re-attaching the header so pandas sees a complete file.
+    # Text columns are read as text, as the polars engine does, so a code column with an NA
+    # in the segment never comes back as '11244.0'.
+    with open(csv_file, 'rb') as f:
+        header = f.readline()
+        f.seek(start)
+        body = f.read(end - start)
+    dtypes = {col: str for col in column_types[table_name]['string']}
+    return pd.read_csv(io.BytesIO(header + body), keep_default_na=False, na_values=['NA'], dtype=dtypes, low_memory=False)
+
+def polars_schema(types):
+    # Columns listed in column_types are read as text at parse time, so codes keep their
+    # leading zeros and never round-trip through floats
+    return {col: pl.Utf8 for col in types['string'] + types.get('date', [])} | {col: pl.Int64 for col in types['int']}
 
-    # Generate a table name from the first word of the CSV file name
-    table_name = os.path.splitext(os.path.basename(csv_file))[0]
+def polars_conversions(types):
+    # The same conversions as convert_types, as expressions Polars can run while streaming
+    conversions = [pl.col(col).fill_null('NA') for col in types['string']]
+    conversions += [pl.col(col).fill_null(0) for col in types['int']]  # 'NA' becomes 0
+    conversions += [
+        pl.col(col).str.strptime(pl.Date, '%Y-%m-%d', strict=False)
+        .fill_null(datetime.date(1677, 9, 21))  # pd.Timestamp.min, as the pandas engine uses
+        .dt.strftime('%m/%d/%Y')
+        for col in types.get('date', [])
+    ]
+    return conversions
 
-    # Get the column types for this CSV file
+def scan_csv(csv_file, table_name, skip_rows=0):
+    # Lazily scan the CSV with the schema applied at parse time
     types = column_types[table_name]
+    return (
+        pl.scan_csv(csv_file, schema_overrides=polars_schema(types), null_values=['NA'], infer_schema_length=infer_schema_rows, skip_rows_after_header=skip_rows)
+        .with_columns(polars_conversions(types))
+    )
+
+def streamed_chunks(csv_files, resume, years=None):
+    # Polars' streaming engine parses on all cores, and only batch_rows rows are held
+    # at once, so memory stays flat
+    for csv_file, table_name in csv_files.items():
+        source_hash, committed = resume.get(csv_file, (None, {}))
+        if committed is None:
+            continue
+
+        # Batches always commit in order, so resuming means skipping the rows already written
+        chunk_no = len(committed)
+        row = sum(rows for _, _, rows in committed.values())
+        lf = scan_csv(csv_file, table_name, skip_rows=row)
+
+        # Delta load: the year filter is pushed into the scan
+        if years and table_name in year_columns:
+            lf = lf.filter(pl.col(year_columns[table_name]).is_in(years))
+
+        for chunk in lf.collect_batches(chunk_size=batch_rows):
+            checkpoint = (source_hash, chunk_no, row, row + len(chunk)) if source_hash else None
+            yield table_name, chunk, checkpoint
+            chunk_no += 1
+            row += len(chunk)
+
+def init_worker(queue):
+    # Give each parser process a handle on the queue feeding the writer
+    global chunk_queue
+    chunk_queue = queue
+
+def process_csv(task):
+    # Parse and type-convert one segment, then hand it to the writer.
+    # Workers never touch the database, so they never contend for the SQLite write lock.
+    csv_file, table_name, start, end, checkpoint, years = task
+
+    chunk = read_segment(csv_file, table_name, start, end)
+
+    # Delta load: keep only the years being replaced
+    if years and table_name in year_columns:
+        chunk = chunk[chunk[year_columns[table_name]].isin(years)]
+
+    # Dates in the CSV are in '%Y-%m-%d' format
+    chunk = convert_types(chunk, column_types[table_name], date_format='%Y-%m-%d')
+    chunk_queue.put((table_name, chunk, checkpoint))
+
+def open_writer(bulk=False):
+    # Transactions are managed explicitly, so turn off sqlite3's implicit ones
+    conn = sqlite3.connect('my_database.db', isolation_level=None)
+    if bulk:
+        for pragma in bulk_load_pragmas:
+            conn.execute(pragma)
+    else:
+        # A bulk load that was killed leaves the file in WAL mode, so every other writer
+        # puts the durable configuration back before it writes
+        for pragma in safe_pragmas:
+            conn.execute(pragma)
+    return conn
+
+def close_writer(conn, bulk=False):
+    # Put the database back into its normal, fully durable configuration
+    if bulk:
+        for pragma in safe_pragmas:
+            conn.execute(pragma)
+    conn.close()
+
+def create_table(conn, table_name, chunk):
+    # Create the table from the first chunk's columns, as to_sql would
+    if isinstance(chunk, pl.DataFrame):
+        sqlite_types = {col: 'INTEGER' if dtype.is_integer() else 'REAL' if dtype.is_float() else 'TEXT' for col, dtype in chunk.schema.items()}
+        columns = ',\n  '.join(f'"{col}" {sqlite_type}' for col, sqlite_type in sqlite_types.items())
+        conn.execute(f'CREATE TABLE "{table_name}" (\n  {columns}\n)')
+    else:
+        conn.execute(pd.io.sql.get_schema(chunk, table_name))
+
+def chunk_rows(chunk):
+    # Plain Python values with None for missing cells, which is what sqlite3 binds
+    if isinstance(chunk, pl.DataFrame):
+        return chunk.iter_rows()
+    return chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+
+def insert_chunk(conn, table_name, chunk):
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone()
+    if exists is None:
+        create_table(conn, table_name, chunk)
+
+    columns = ', '.join(f'"{col}"' for col in chunk.columns)
+    placeholders = ', '.join(['?'] * len(chunk.columns))
+    conn.executemany(f'INSERT INTO "{table_name}" ({columns}) VALUES ({placeholders})', chunk_rows(chunk))
+
+def queued_chunks(queue, expected, result):
+    # Yield the chunks the parser processes put on the queue
+    received = 0
+    while received < expected:
+        try:
+            item = queue.get(timeout=1)
+        except Empty:
+            # Re-raise a parser failure instead of waiting forever for its chunk
+            if result.ready():
+                result.get()
+            continue
+        received += 1
+        yield item
+
+def write_chunks(chunks, bulk=False):
+    # Single writer: the only connection writing to the database while loading
+    conn = open_writer(bulk)
+
+    # In bulk mode several chunks share one transaction; otherwise each chunk commits on its own
+    batch_chunks = bulk_batch_chunks if bulk else 1
+
+    written = 0
+    try:
+        conn.execute('BEGIN')
+        for table_name, chunk, checkpoint in chunks:
+            insert_chunk(conn, table_name, chunk)
+            if checkpoint is not None:
+                record_checkpoint(conn, table_name, len(chunk), checkpoint)
+            written += 1
+            print(f"Wrote {len(chunk)} rows to {table_name} (chunk {written})")
+
+            if written % batch_chunks == 0:
+                conn.execute('COMMIT')
+                conn.execute('BEGIN')
+        conn.execute('COMMIT')
+    finally:
+        # Restore the safe pragmas even when the load fails; the open batch is rolled back
+        # and its chunks are loaded again on the next run
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        close_writer(conn, bulk)
+
+def write_parquet(chunks, years=None):
+    # Chunks are spooled as part files per partition; a table (or, for a delta load, the
+    # partitions of the years being replaced) is cleared the first time it is seen
+    part_numbers = {}
+    partitions = set()
+    for table_name, chunk, _ in chunks:
+        table_dir = os.path.join(parquet_root, table_name)
+        partition_col = year_columns.get(table_name)
+        if table_name not in part_numbers:
+            if years and partition_col:
+                for year in years:
+                    shutil.rmtree(os.path.join(table_dir, f'{partition_col}={year}'), ignore_errors=True)
+            else:
+                shutil.rmtree(table_dir, ignore_errors=True)
+            part_numbers[table_name] = 0
+
+        if isinstance(chunk, pd.DataFrame):
+            # pandas parses each segment on its own, so a numeric column is float64 in a segment
+            # with an NA and int64 in one without. Its numbers are all written as Float64, so
+            # every part and partition of the table has the same schema.
+            chunk = pl.from_pandas(chunk)
+            chunk = chunk.with_columns([
+                pl.col(col).cast(pl.Float64) for col, dtype in chunk.schema.items()
+                if dtype.is_numeric() and col != partition_col
+            ])
+
+        # The partition column lives in the directory name, not in the files
+        if partition_col is None:
+            parts = {table_dir: chunk}
+        else:
+            parts = {
+                os.path.join(table_dir, f'{partition_col}={value}'): part
+                for (value,), part in chunk.partition_by(partition_col, as_dict=True, include_key=False).items()
+            }
+
+        for directory, part in parts.items():
+            os.makedirs(directory, exist_ok=True)
+            # Spooled with fast compression; compact_partition rewrites them
+            part.write_parquet(os.path.join(directory, f'spool-{part_numbers[table_name]:05d}.parquet'), compression='lz4')
+            partitions.add(directory)
+
+        part_numbers[table_name] += 1
+        print(f"Spooled {len(chunk)} rows to {table_dir} (part {part_numbers[table_name]})")
+
+    for directory in sorted(partitions):
+        compact_partition(directory)
+
+def compact_partition(directory):
+    # Rewrite a partition's spooled parts as one zstd file sorted by bank across the whole
+    # partition, so row group statistics let bank filters skip everything but a few groups
+    spooled = sorted(glob.glob(os.path.join(directory, 'spool-*.parquet')))
+    lf = pl.scan_parquet(spooled)
+    if 'id_rssd' in lf.collect_schema().names():
+        lf = lf.sort('id_rssd')
+    lf.sink_parquet(os.path.join(directory, 'data.parquet'), compression='zstd')
+    for path in spooled:
+        os.remove(path)
+    print(f"Compacted {len(spooled)} parts into {os.path.join(directory, 'data.parquet')}")
+
+def file_hash(path):
+    # Content hash of a source file, read in blocks so a 4GB CSV never sits in memory
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(16 * 1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def reset_table(conn, table_name):
+    # Drop a table whose rows can't be trusted to match its source, along with its checkpoints
+    conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+    conn.execute('DELETE FROM load_manifest WHERE table_name = ?', (table_name,))
+    conn.execute('DELETE FROM load_files WHERE table_name = ?', (table_name,))
+
+def delete_years(conn, table_name, years):
+    # Clear the years a delta load is about to write, so re-running it never duplicates rows
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone()
+    if exists is not None:
+        placeholders = ', '.join(['?'] * len(years))
+        deleted = conn.execute(f'DELETE FROM "{table_name}" WHERE "{year_columns[table_name]}" IN ({placeholders})', years).rowcount
+        print(f"Deleted {deleted} rows for {', '.join(map(str, years))} from {table_name}")
+
+def plan_resume(csv_files, engine, years=None, reload=False):
+    # For each file, work out which chunks are already in the database. A file that was
+    # fully loaded maps to None and is skipped; anything that doesn't match the manifest
+    # (changed file, other engine, rows without a manifest) is reloaded from scratch.
+    conn = open_writer()
+    for statement in manifest_tables:
+        conn.execute(statement)
+    # Manifests written before delta loads were recorded
+    if 'delta_years' not in {row[1] for row in conn.execute('PRAGMA table_info(load_files)')}:
+        conn.execute('ALTER TABLE load_files ADD COLUMN delta_years TEXT')
+
+    resume = {}
+    for csv_file, table_name in csv_files.items():
+        # Delta loads replace whole years and leave the other years and the manifest alone.
+        # The new years must be parsed by the engine that loaded the rest of the table, or
+        # the same codes could be written two different ways.
+        if years and table_name in year_columns:
+            loaded = conn.execute('SELECT engine, delta_years FROM load_files WHERE table_name = ?', (table_name,)).fetchone()
+            if loaded is not None and loaded[0] != engine:
+                close_writer(conn)
+                raise SystemExit(f"{table_name} was loaded with --engine {loaded[0]}; run the delta load with --engine {loaded[0]} or reload every year")
+            delete_years(conn, table_name, years)
+
+            # The table now mixes this file's rows for these years with earlier rows for the
+            # others. Recording the file and the years means a plain run on the same file keeps
+            # the table, and one on another file refuses to throw the other years away.
+            delta_years = set(years) | (set(map(int, loaded[1].split(','))) if loaded and loaded[1] else set())
+            conn.execute(
+                '''INSERT INTO load_files (table_name, source_file, source_hash, engine, delta_years) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (table_name) DO UPDATE SET source_file = excluded.source_file, source_hash = excluded.source_hash,
+                    completed_at = NULL, delta_years = excluded.delta_years''',
+                (table_name, csv_file, file_hash(csv_file), engine, ','.join(map(str, sorted(delta_years))))
+            )
+            resume[csv_file] = (None, {})
+            continue
+
+        source_hash = file_hash(csv_file)
+        loaded = conn.execute('SELECT source_hash, engine, completed_at, delta_years FROM load_files WHERE table_name = ?', (table_name,)).fetchone()
+        committed = {
+            chunk_no: (start, end, rows)
+            for chunk_no, start, end, rows in conn.execute(
+                'SELECT chunk_no, start_offset, end_offset, rows FROM load_manifest WHERE table_name = ? AND source_hash = ?', (table_name, source_hash)
+            )
+        }
+
+        # pandas segments are only reusable if the file is split the same way as before
+        if engine == 'pandas':
+            segments = dict(enumerate(plan_segments(csv_file)))
+            aligned = all(segments.get(chunk_no) == (start, end) for chunk_no, (start, end, _) in committed.items())
+        else:
+            aligned = True
+
+        unchanged = loaded is not None and loaded[:2] == (source_hash, engine) and aligned
+        if unchanged and loaded[2] is not None:
+            print(f"{csv_file} is unchanged since it was loaded into {table_name}, skipping")
+            resume[csv_file] = (source_hash, None)
+            continue
+
+        # Reloading a delta-loaded table from this file alone would drop every year it lacks
+        if loaded is not None and loaded[3] is not None and not reload:
+            close_writer(conn)
+            raise SystemExit(
+                f"{table_name} has had delta loads (--years {loaded[3].replace(',', ' ')}) and may hold years {csv_file} lacks. "
+                f"Re-run the delta load, or pass --reload to rebuild {table_name} from {csv_file} alone."
+            )
+
+        if unchanged and loaded[3] is None:
+            print(f"Resuming {table_name} from {csv_file} after {len(committed)} committed chunks")
+        else:
+            if loaded is not None or conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone():
+                print(f"Reloading {table_name}: its rows don't match {csv_file}")
+            reset_table(conn, table_name)
+            conn.execute('INSERT INTO load_files (table_name, source_file, source_hash, engine) VALUES (?, ?, ?, ?)', (table_name, csv_file, source_hash, engine))
+            committed = {}
+
+        resume[csv_file] = (source_hash, committed)
 
-    # Define the date format (input format in the CSV)
-    date_format = '%Y-%m-%d'
-
-    # Read and write the CSV file in chunks
-    chunksize = 150000  # adjust this value depending on your system's memory
-    for chunk in pd.read_csv(csv_file, chunksize=chunksize, keep_default_na=False, na_values=['NA'], low_memory=False):
-        # Convert the columns to the correct types
-        for col in types['string']:
-            chunk[col] = chunk[col].astype(str).fillna('NA')  # Ensure 'NA' is treated as string
-        for col in types['int']:
-            chunk[col] = pd.to_numeric(chunk[col], errors='coerce').fillna(0).astype(int)  # 'NA' becomes 0
-        for col in types.get('date', []):
-            chunk[col] = pd.to_datetime(chunk[col], format=date_format, errors='coerce')  # Convert to datetime
-            chunk[col] = chunk[col].fillna(pd.Timestamp.min)  # Handle 'NA' in date columns, setting to a minimum date
-            chunk[col] = chunk[col].dt.strftime('%m/%d/%Y')  # Format dates as MM/DD/YYYY
-
-        chunk.to_sql(table_name, engine, if_exists='append', index=False)
-
-def process_excel(sheet_name, table_name):
+    close_writer(conn)
+    return resume
+
+def record_checkpoint(conn, table_name, rows, checkpoint):
+    # Runs inside the writer's transaction, so the manifest never claims rows that were rolled back
+    source_hash, chunk_no, start, end = checkpoint
+    conn.execute(
+        'INSERT INTO load_manifest VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (table_name, source_hash, chunk_no, start, end, rows, datetime.datetime.now().isoformat())
+    )
+
+def finish_resume(resume, csv_files):
+    # Mark the files as complete, delta loads included, so the next run on the same files is a no-op
+    conn = open_writer()
+    for csv_file, (_, committed) in resume.items():
+        if committed is not None:
+            conn.execute('UPDATE load_files SET completed_at = ? WHERE table_name = ?', (datetime.datetime.now().isoformat(), csv_files[csv_file]))
+    close_writer(conn)
+
+def write_target(chunks, bulk=False, target='sqlite', years=None):
+    if target == 'parquet':
+        write_parquet(chunks, years)
+    else:
+        write_chunks(chunks, bulk)
+
+def load_csv_files(csv_files, workers=None, bulk=False, engine='polars', target='sqlite', years=None, reload=False):
+    # The database keeps a manifest of committed chunks; the Parquet target is always rewritten.
+    # Returns whether any file was loaded, so the tables derived from them can be left alone
+    # when every file was already complete.
+    resume = plan_resume(csv_files, engine, years, reload) if target == 'sqlite' else {}
+    loaded = target != 'sqlite' or any(committed is not None for _, committed in resume.values())
+
+    if engine == 'polars':
+        write_target(streamed_chunks(csv_files, resume, years), bulk, target, years)
+    else:
+        load_segments(csv_files, resume, workers, bulk, target, years)
+
+    if target == 'sqlite':
+        finish_resume(resume, csv_files)
+    return loaded
+
+def load_segments(csv_files, resume, workers=None, bulk=False, target='sqlite', years=None):
+    # Plan the segments of every file up front so the parser pool stays busy across files
+    tasks = []
+    for csv_file, table_name in csv_files.items():
+        source_hash, committed = resume.get(csv_file, (None, {}))
+        if committed is None:
+            continue
+        for chunk_no, (start, end) in enumerate(plan_segments(csv_file)):
+            if chunk_no not in committed:
+                checkpoint = (source_hash, chunk_no, start, end) if source_hash else None
+                tasks.append((csv_file, table_name, start, end, checkpoint, years))
+
+    # The bounded queue applies back-pressure: parsers wait while the writer catches up
+    queue = Queue(maxsize=queue_size)
+    with Pool(processes=workers or cpu_count(), initializer=init_worker, initargs=(queue,)) as p:
+        result = p.map_async(process_csv, tasks, chunksize=1)
+        write_target(queued_chunks(queue, len(tasks), result), bulk, target, years)
+        result.get()
+
+def bank_dimension(pe_file):
+    # Canonical name for each id_rssd (upper case, standalone AND as &, taken from the latest
+    # exam) and every name it has been examined under, read straight from the PE CSV
+    pe = (
+        pl.scan_csv(pe_file, schema_overrides={'bank_name': pl.Utf8}, null_values=['NA'], infer_schema_length=infer_schema_rows)
+        .select(pl.col('id_rssd').cast(pl.Int64, strict=False), 'bank_name', 'exam_year')
+        .drop_nulls(['id_rssd', 'bank_name'])
+        # Kept as text like Retail_Table.id_rssd, so the lookup is a plain index equality
+        .with_columns(pl.col('id_rssd').cast(pl.Utf8))
+        .with_columns(pl.col('bank_name').str.to_uppercase().str.replace_all(r'\bAND\b', '&').alias('canonical_name'))
+        .collect()
+    )
+
+    bank = (
+        pe.sort(['id_rssd', 'exam_year'], descending=[False, True], nulls_last=True)
+        .group_by('id_rssd', maintain_order=True)
+        .agg(pl.col('canonical_name').first().alias('bank_name'))
+    )
+    aliases = (
+        pe.group_by(['id_rssd', 'bank_name'], maintain_order=True)
+        .agg(pl.col('exam_year').min().alias('first_exam_year'), pl.col('exam_year').max().alias('last_exam_year'))
+        .rename({'bank_name': 'alias'})
+    )
+    return bank, aliases
+
+def build_bank_tables(pe_file, target='sqlite'):
+    # The app resolves names through these tables, so the PE CSV is never rewritten
+    bank, aliases = bank_dimension(pe_file)
+    renamed = aliases.group_by('id_rssd').len().filter(pl.col('len') > 1).height
+    print(f"Built bank dimension: {bank.height} banks, {renamed} examined under more than one name")
+
+    if target == 'parquet':
+        write_parquet([('bank', bank, None), ('bank_alias', aliases, None)])
+        return
+
+    conn = open_writer()
+    conn.execute('BEGIN')
+    conn.execute('DROP TABLE IF EXISTS bank')
+    conn.execute('DROP TABLE IF EXISTS bank_alias')
+    conn.execute('CREATE TABLE bank (id_rssd TEXT PRIMARY KEY, bank_name TEXT NOT NULL)')
+    conn.execute('CREATE TABLE bank_alias (id_rssd TEXT NOT NULL, alias TEXT NOT NULL, first_exam_year INTEGER, last_exam_year INTEGER, PRIMARY KEY (id_rssd, alias))')
+    conn.executemany('INSERT INTO bank VALUES (?, ?)', bank.iter_rows())
+    conn.executemany('INSERT INTO bank_alias VALUES (?, ?, ?, ?)', aliases.iter_rows())
+    conn.execute('COMMIT')
+    close_writer(conn)
+
+def build_bank_catalog(years=None):
+    # The banks with retail rows in each year, which the bank dropdown lists. Names are
+    # joined from bank when read, so they always follow the current canonical name.
+    conn = open_writer()
+    if not table_exists(conn, 'bank_catalog'):
+        years = None
+
+    conn.execute('BEGIN')
+    if years:
+        delete_years(conn, 'bank_catalog', years)
+        year_filter = f"WHERE ActivityYear IN ({', '.join(map(str, years))})"
+    else:
+        conn.execute('DROP TABLE IF EXISTS bank_catalog')
+        conn.execute('CREATE TABLE bank_catalog (ActivityYear INTEGER NOT NULL, id_rssd TEXT NOT NULL, PRIMARY KEY (ActivityYear, id_rssd)) WITHOUT ROWID')
+        year_filter = ''
+    conn.execute(f'INSERT INTO bank_catalog SELECT DISTINCT ActivityYear, id_rssd FROM Retail_Table {year_filter}')
+    conn.execute('COMMIT')
+    counts = conn.execute('SELECT ActivityYear, COUNT(*) FROM bank_catalog GROUP BY ActivityYear ORDER BY ActivityYear').fetchall()
+    close_writer(conn)
+    print(f"Built bank_catalog: {', '.join(f'{year}: {count} banks' for year, count in counts)}")
+
+def write_bank_catalog(years=None):
+    # The same catalog for the Parquet target, one file per year
+    lf = pl.scan_parquet(os.path.join(parquet_root, 'Retail_Table', '**', '*.parquet'), hive_partitioning=True)
+    if not os.path.isdir(os.path.join(parquet_root, 'bank_catalog')):
+        years = None
+    if years:
+        lf = lf.filter(pl.col('ActivityYear').is_in(years))
+    catalog = lf.select(['ActivityYear', 'id_rssd']).unique().collect()
+    write_parquet([('bank_catalog', catalog, None)], years)
+
+def build_geography_tables(target='sqlite'):
+    # Deduplicated names for every MSA/MD code and (state, county) pair in the tract table.
+    # Vintages are read newest first and the first name for a key wins, so the current
+    # crosswalk is used wherever a code appears in both.
+    conn = open_writer()
+    if not table_exists(conn, 'tract'):
+        print("No tract table found, skipping the geography tables")
+        close_writer(conn)
+        return
+
+    # For the Parquet target they are built as temporary tables, so the geography tables
+    # already in the database are left as they are
+    if target == 'parquet':
+        table_kind = 'TEMP TABLE'
+    else:
+        table_kind = 'TABLE'
+
+    conn.execute('BEGIN')
+    if target != 'parquet':
+        conn.execute('DROP TABLE IF EXISTS geo_area')
+        conn.execute('DROP TABLE IF EXISTS geo_county')
+    conn.execute(f'CREATE {table_kind} geo_area (area_code TEXT PRIMARY KEY, area_name TEXT NOT NULL)')
+    conn.execute(f'CREATE {table_kind} geo_county (state_code INTEGER NOT NULL, county_code INTEGER NOT NULL, area_name TEXT NOT NULL, PRIMARY KEY (state_code, county_code))')
+    for vintage in tract_sheets.values():
+        conn.execute("""
+            INSERT OR IGNORE INTO geo_area
+            SELECT "MSA/MD code", "MSA/MD name" FROM tract
+            WHERE vintage = ? AND "MSA/MD code" NOT IN ('NA', 'nan', '') AND "MSA/MD name" IS NOT NULL
+            ORDER BY rowid
+        """, (vintage,))
+        # Codes are stored as text, so compare them as integers
+        conn.execute("""
+            INSERT OR IGNORE INTO geo_county
+            SELECT CAST("State code" AS INTEGER), CAST("County code" AS INTEGER), "County name" || ', ' || "State" FROM tract
+            WHERE vintage = ? AND CAST("State code" AS INTEGER) > 0 AND CAST("County code" AS INTEGER) > 0
+            ORDER BY rowid
+        """, (vintage,))
+    conn.execute('COMMIT')
+
+    geography = {}
+    for table_name in ['geo_area', 'geo_county']:
+        cursor = conn.execute(f'SELECT * FROM {table_name}')
+        geography[table_name] = pl.DataFrame(cursor.fetchall(), schema=[col[0] for col in cursor.description], orient='row')
+    close_writer(conn)
+    print(f"Built geography: {geography['geo_area'].height} MSA/MD codes, {geography['geo_county'].height} counties")
+
+    # The tract table only lives in SQLite, so the Parquet store gets a copy of the result
+    if target == 'parquet':
+        write_parquet([(table_name, df, None) for table_name, df in geography.items()])
+
+def aggregate_columns(retail_columns):
+    # Every column any report sums, in first-seen order. Whatever type a column was stored
+    # as, it is summed: a column that is all NA in the rows the type was inferred from is
+    # text, but the reports still read it.
+    columns = dict.fromkeys(col for report in aggregate_reports for col in report_columns[report])
+    return [col for col in columns if col in retail_columns and col not in text_columns]
+
+def report_sums(columns):
+    # The summed columns of each agg_<report> table, after its four key columns
+    return {report: [col for col in report_columns[report] if col in columns] for report in aggregate_reports}
+
+def table_columns(conn, table_name):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+
+def build_report_aggregates(bulk=False, years=None):
+    conn = open_writer(bulk)
+    columns = aggregate_columns(table_columns(conn, 'Retail_Table'))
+    report_tables = report_sums(columns)
+
+    # A delta load only re-sums its years, unless a table is missing or was built with other
+    # columns and needs every year
+    if not all(table_columns(conn, f'agg_{report}')[4:] == sums for report, sums in report_tables.items()):
+        years = None
+
+    # SQLite's SUM reads numbers stored as text too
+    sums = ', '.join(f'COALESCE(SUM("{col}"), 0) AS "{col}"' for col in columns)
+    year_filter = f" AND ActivityYear IN ({', '.join(map(str, years))})" if years else ''
+
+    # One grouped pass per lookup method sums every column of every report; the report
+    # tables are then cut from that staging table
+    selects = [
+        f"SELECT id_rssd, ActivityYear, '{method}' AS lookup_method, {key} AS area_key, {sums} "
+        f"FROM Retail_Table WHERE {condition}{year_filter} GROUP BY id_rssd, ActivityYear, area_key"
+        for method, (key, condition) in area_groupings.items()
+    ]
+    conn.execute('BEGIN')
+    conn.execute('DROP TABLE IF EXISTS area_sums')
+    conn.execute(f"CREATE TABLE area_sums AS {' UNION ALL '.join(selects)}")
+    for report, summed_columns in report_tables.items():
+        table_name = f'agg_{report}'
+        summed_list = ', '.join(f'"{col}"' for col in summed_columns)
+        select = f'SELECT id_rssd, ActivityYear, lookup_method, area_key, {summed_list} FROM area_sums'
+        if years:
+            delete_years(conn, table_name, years)
+            conn.execute(f'INSERT INTO {table_name} {select}')
+        else:
+            conn.execute(f'DROP TABLE IF EXISTS {table_name}')
+            conn.execute(f'CREATE TABLE {table_name} AS {select}')
+            conn.execute(f'CREATE UNIQUE INDEX idx_{table_name} ON {table_name} (id_rssd, ActivityYear, lookup_method, area_key)')
+        print(f"Built {table_name}")
+    conn.execute('DROP TABLE area_sums')
+    conn.execute('COMMIT')
+    close_writer(conn, bulk)
+
+def leading_int(col):
+    # CAST(... AS INTEGER) as SQLite does it: '06' and '6.0' are both 6
+    return pl.col(col).str.extract(r'^\s*(\d+)', 1).cast(pl.Int64)
+
+def write_report_aggregates(years=None):
+    # The same agg_<report> tables for the Parquet target, summed by Polars from the part files
+    lf = pl.scan_parquet(os.path.join(parquet_root, 'Retail_Table', '**', '*.parquet'), hive_partitioning=True)
+    schema = lf.collect_schema()
+    columns = aggregate_columns(schema.names())
+    report_tables = report_sums(columns)
+
+    # As for SQLite, a delta load only re-sums its years when every table has the same columns
+    for report, sums in report_tables.items():
+        table_dir = os.path.join(parquet_root, f'agg_{report}')
+        if not os.path.isdir(table_dir):
+            years = None
+            continue
+        stored = pl.scan_parquet(os.path.join(table_dir, '**', '*.parquet'), hive_partitioning=True).collect_schema().names()
+        if set(stored) != {'id_rssd', 'ActivityYear', 'lookup_method', 'area_key', *sums}:
+            years = None
+
+    if years:
+        lf = lf.filter(pl.col('ActivityYear').is_in(years))
+    keys = {
+        'md': (pl.col('MD_Code'), ~pl.col('MD_Code').is_in(['NA', ''])),
+        'msa': (pl.col('MSA_Code'), ~pl.col('MSA_Code').is_in(['NA', ''])),
+        'state_county': (
+            pl.format('{},{}', leading_int('State_Code'), leading_int('County_Code')),
+            (leading_int('State_Code') > 0) & (leading_int('County_Code') > 0)
+        )
+    }
+    area_sums = pl.concat([
+        lf.filter(condition)
+        .group_by(['id_rssd', 'ActivityYear', key.alias('area_key')])
+        # A column stored as text is summed as numbers, as SQLite's SUM does
+        .agg([(pl.col(col) if schema[col].is_numeric() else pl.col(col).cast(pl.Float64, strict=False)).sum() for col in columns])
+        .select(['id_rssd', 'ActivityYear', pl.lit(method).alias('lookup_method'), 'area_key', *columns])
+        for method, (key, condition) in keys.items()
+    ]).collect()
+
+    write_parquet([
+        (f'agg_{report}', area_sums.select(['id_rssd', 'ActivityYear', 'lookup_method', 'area_key', *sums]), None)
+        for report, sums in report_tables.items()
+    ], years)
+
+def cluster_retail_table(bulk=False):
+    # Rebuild Retail_Table sorted by the cluster key. Its indexes are dropped with the
+    # old table, so run build_indexes afterwards.
+    conn = open_writer(bulk)
+    create_sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'Retail_Table'").fetchone()[0]
+    order_by = ', '.join(f'"{col}"' for col in cluster_key)
+
+    print(f"Clustering Retail_Table by {order_by}")
+    conn.execute('BEGIN')
+    conn.execute('DROP TABLE IF EXISTS "Retail_Table_clustered"')
+    # Reuse the original definition so the declared column types are kept
+    conn.execute(create_sql.replace('Retail_Table', 'Retail_Table_clustered', 1))
+    conn.execute(f'INSERT INTO "Retail_Table_clustered" SELECT * FROM "Retail_Table" ORDER BY {order_by}')
+    conn.execute('DROP TABLE "Retail_Table"')
+    conn.execute('ALTER TABLE "Retail_Table_clustered" RENAME TO "Retail_Table"')
+    conn.execute('COMMIT')
+    close_writer(conn, bulk)
+
+def table_exists(conn, table_name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ? COLLATE NOCASE", (table_name,)).fetchone() is not None
+
+def build_indexes(bulk=False):
+    # Safe to re-run: existing indexes are kept, so this also upgrades an existing database
+    conn = open_writer(bulk)
+    for index_name in retired_indexes:
+        conn.execute(f'DROP INDEX IF EXISTS "{index_name}"')
+    for index_name, (table_name, columns) in indexes.items():
+        if not table_exists(conn, table_name):
+            print(f"Skipping index {index_name}: no {table_name} table")
+            continue
+        # Expressions are used as written, column names are quoted
+        column_list = ', '.join(col if '(' in col else f'"{col}"' for col in columns)
+        print(f"Building index {index_name} on {table_name} ({column_list})")
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" ({column_list})')
+
+    # Refresh the planner statistics so the composite indexes are actually chosen
+    conn.execute('ANALYZE')
+    close_writer(conn, bulk)
+
+def process_excel(sheet_name, vintage):
     # Create a connection engine to the SQLite database
     engine = create_engine('sqlite:///my_database.db')
 
-    # Get the column types for this sheet
-    types = column_types[table_name]
+    # Every crosswalk sheet has the same layout
+    types = column_types['tract']
 
-    # Read the Excel sheet into a DataFrame
-    df = pd.read_excel('data/MSA_state_county_tract.xlsx', sheet_name=sheet_name)
+    # Read the Excel sheet into a DataFrame, as text so codes in columns with blanks
+    # are not turned into floats ('31084.0')
+    df = pd.read_excel('data/MSA_state_county_tract.xlsx', sheet_name=sheet_name, dtype=str)
 
     # Convert the columns to the correct types
-    for col in types['string']:
-        df[col] = df[col].astype(str).fillna('NA')  # Ensure 'NA' is treated as string
-    for col in types['int']:
-        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)  # 'NA' becomes 0
-    for col in types.get('date', []):
-        df[col] = pd.to_datetime(df[col], errors='coerce')  # Convert to datetime
-        df[col] = df[col].fillna(pd.Timestamp.min)  # Handle 'NA' in date columns, setting to a minimum date
-        df[col] = df[col].dt.strftime('%m/%d/%Y')  # Format dates as MM/DD/YYYY
+    df = convert_types(df, types)
 
-    df.to_sql(table_name, engine, if_exists='append', index=False)
+    # All vintages share one table, told apart by this column
+    df.insert(0, 'vintage', vintage)
 
-def generate_excel_output(engine, table_names):
-    for table_name in table_names:
-        df = pd.read_sql_table(table_name, engine)
+    df.to_sql('tract', engine, if_exists='append', index=False)
+
+def load_tracts():
+    # The crosswalk is small and replaced as a whole on every full load
+    conn = open_writer()
+    conn.execute('DROP TABLE IF EXISTS tract')
+    close_writer(conn)
+    for sheet_name, vintage in tract_sheets.items():
+        print(f"Loading sheet {sheet_name} into tract as vintage {vintage}")
+        process_excel(sheet_name, vintage)
+
+def audit_column_types(conn, table_name):
+    # One streaming pass over the table: SQLite collects the distinct storage classes
+    # of every column itself, so no rows are ever brought into Python
+    columns = [row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info("{table_name}")')]
+    type_sets = ', '.join(f'group_concat(DISTINCT typeof("{col}"))' for col in columns)
+    row = conn.exec_driver_sql(f'SELECT {type_sets} FROM "{table_name}"').fetchone()
+    return {col: set(types.split(',')) if types else set() for col, types in zip(columns, row)}
+
+def pandas_dtype(storage_classes):
+    # The dtype read_sql_table would have given the column
+    if storage_classes == {'integer'}:
+        return 'int64'
+    if storage_classes <= {'integer', 'real', 'null'} and storage_classes & {'integer', 'real'}:
+        return 'float64'
+    return 'object'
 
-        # Check if all cells in a column are of the same data type
-        mixed_type_cols = df.applymap(type).nunique()
-        mixed_type_cols = mixed_type_cols[mixed_type_cols > 1]
+def mixed_types(storage_classes):
+    # As read_sql_table gives them: numeric columns come back as float64, with NULLs as NaN
+    # and integers as floats, so only object columns can hold more than one Python type
+    if pandas_dtype(storage_classes) != 'object' or len(storage_classes) < 2:
+        return 'No'
+    return ', '.join(python_types[c] for c in sorted(storage_classes))
 
-        # Create a DataFrame from df.dtypes
-        dtypes_df = df.dtypes.reset_index()
-        dtypes_df.columns = ['Column Name', 'Data Type']
+def generate_excel_output(engine, table_names):
+    with engine.connect() as conn:
+        for table_name in table_names:
+            column_storage = audit_column_types(conn, table_name)
 
-        # Add a new column to dtypes_df for mixed data types
-        dtypes_df['Mixed Types'] = dtypes_df['Column Name'].apply(lambda x: ', '.join(set(df[x].map(type).astype(str))) if x in mixed_type_cols else 'No')
+            # Same report as before: a column is mixed when its cells hold more than one type
+            dtypes_df = pd.DataFrame({
+                'Column Name': list(column_storage),
+                'Data Type': [pandas_dtype(classes) for classes in column_storage.values()],
+                'Mixed Types': [mixed_types(classes) for classes in column_storage.values()],
+            })
 
-        # Output to Excel
-        dtypes_df.to_excel(f"{table_name}_dtypes.xlsx", index=False)
+            # Output to Excel
+            dtypes_df.to_excel(f"{table_name}_dtypes.xlsx", index=False)
 
 if __name__ == '__main__':
-    # List of CSV files
-    csv_files = [
-        'data/retail_loan_lending_test_table.csv',
-        'data/performance_evaluation_table.csv'
-    ]
+    parser = argparse.ArgumentParser(description='Load the CRA CSV and Excel files into my_database.db')
+    parser.add_argument('--bulk', action='store_true', help='Fast rebuild: relax journaling and fsyncs during the load and batch chunks into large transactions')
+    parser.add_argument('--engine', choices=['polars', 'pandas'], default='polars', help='polars: streaming scan with the schema applied at parse time; pandas: segments parsed in a process pool')
+    parser.add_argument('--index-only', action='store_true', help='Only build the query indexes and statistics on an existing my_database.db')
+    parser.add_argument('--target', choices=['sqlite', 'parquet'], default='sqlite', help='sqlite: my_database.db; parquet: zstd Parquet files under parquet/, partitioned by ActivityYear')
+    parser.add_argument('--years', type=int, nargs='+', help='Delta load: replace only these ActivityYears in Retail_Table and keep the others')
+    parser.add_argument('--reload', action='store_true', help='Rebuild tables that have had delta loads from the CSVs alone, dropping any years the CSVs lack')
+    parser.add_argument('--cluster', action='store_true', help='Rewrite Retail_Table sorted by bank, year and geography so each report reads contiguous pages')
+    args = parser.parse_args()
 
-    excel_sheets = {
-        '2024 tracts': '2024_tracts',
-        '2022-2023 tracts': '2022_2023_tracts'
+    if args.index_only:
+        if args.cluster:
+            cluster_retail_table()
+        build_indexes()
+        raise SystemExit
+
+    # CSV files and the tables they are loaded into
+    csv_files = {
+        'data/retail_loan_lending_test_table.csv': 'Retail_Table',
+        'data/performance_evaluation_table.csv': 'PE_Table'
     }
 
-    # Create a pool of worker processes
-    with Pool() as p:
-        p.map(process_csv, csv_files)
+    # Parse in parallel and write from this process
+    loaded = load_csv_files(csv_files, bulk=args.bulk, engine=args.engine, target=args.target, years=args.years, reload=args.reload)
+
+    # Canonical bank names and their historical aliases, keyed by id_rssd
+    build_bank_tables('data/performance_evaluation_table.csv', target=args.target)
+
+    # Re-running on files that were already fully loaded leaves the tables built from them
+    # as they are, instead of scanning all of Retail_Table again
+    if not loaded:
+        print("Every CSV was already loaded, keeping the crosswalk, geography, aggregate and catalog tables")
+    else:
+        # The crosswalk does not change with the lending years, so a delta load keeps it
+        if not args.years:
+            load_tracts()
+
+        # Assessment area names, resolved once here instead of per row in the app
+        build_geography_tables(target=args.target)
+
+        # Per bank, year and area sums for each report, so serving one reads a single row,
+        # and the banks active in each year for the bank dropdown
+        if args.target == 'parquet':
+            write_report_aggregates(years=args.years)
+            write_bank_catalog(years=args.years)
+        else:
+            build_report_aggregates(bulk=args.bulk, years=args.years)
+            build_bank_catalog(years=args.years)
+
+    # Indexes, clustering and the dtype report only apply to the SQLite database
+    if args.target == 'parquet':
+        raise SystemExit
+
+    if args.cluster:
+        cluster_retail_table(bulk=args.bulk)
+
+    # Index the access paths used by the app once the rows are in
+    build_indexes(bulk=args.bulk)
+
+    # The dtype report reads every year, so a delta load leaves it alone
+    if args.years:
+        raise SystemExit
 
     # Generate the Excel output after all CSV files have been processed
     engine = create_engine('sqlite:///my_database.db')
-    table_names = [os.path.splitext(os.path.basename(csv_file))[0] for csv_file in csv_files]
+    table_names = list(csv_files.values())
     generate_excel_output(engine, table_names)
@@ -1,12 +1,170 @@
+import os
 import streamlit as st
 from modules import CRA_Func as CRA
 from modules import SQL_Queries as SQL
+from modules import Parquet_Queries as PQ
 from modules import Format as fmt
+from modules import Task_Graph
 
 
 st.set_page_config(page_title='CRA Analysis', layout='wide', page_icon=':📊:')
 
-engine = SQL.create_db_connection()
+# How long a cached result is reused, in seconds, before it is fetched again
+cache_ttl = int(os.environ.get('CRA_CACHE_TTL', 3600))
+
+# One engine and one store per process, shared by every session and rerun
+@st.cache_resource
+def get_engine():
+    return SQL.create_db_connection()
+
+@st.cache_resource
+def get_store():
+    return PQ.create_store_connection()
+
+engine = get_engine()
+
+# Set CRA_BACKEND=parquet to serve reports from the store written by csv_to_db.py --target parquet
+if os.environ.get('CRA_BACKEND') == 'parquet':
+    Q = PQ
+    source = get_store()
+else:
+    Q = SQL
+    source = engine
+
+# Reruns reuse these until they expire instead of querying again on every widget change.
+# Arguments with a leading underscore are the shared connections, left out of the cache key.
+@st.cache_data(ttl=cache_ttl, max_entries=16)
+def cached_bank_names(_source, selected_year):
+    return ['Select...'] + sorted(Q.fetch_bank_names_for_year(_source, selected_year))
+
+@st.cache_data(ttl=cache_ttl, max_entries=256)
+def cached_assessment_areas(_source, selected_bank, selected_year):
+    return Q.fetch_assessment_area(_source, selected_bank, selected_year)
+
+@st.cache_data(ttl=cache_ttl, max_entries=64)
+def cached_overall_report(_source, _engine, selected_bank, selected_year):
+    # The bank-year's rows and the HTML of the five Overall tables. The two fetches run side
+    # by side, then every table is built as soon as the data it needs is in.
+    results = Task_Graph.run_tasks({
+        'df': (lambda: Q.fetch_loan_data_overall(_source, selected_bank, selected_year), []),
+        'overall_areas': (lambda: Q.fetch_assessment_area(_source, selected_bank, selected_year), []),
+        'loan_dist_html': (lambda df: CRA.overall_distribution_great_tables(df, selected_bank).as_raw_html(), ['df']),
+        'inside_out_html': (lambda df: CRA.overall_inside_out_great_table(df, selected_bank).as_raw_html(), ['df']),
+        'top_areas_html': (lambda df, areas: CRA.top_areas(_engine, df, selected_bank, selected_year, areas).as_raw_html(), ['df', 'overall_areas']),
+        'top_bus_html': (lambda df, areas: CRA.top_business_areas(_engine, df, selected_bank, selected_year, areas).as_raw_html(), ['df', 'overall_areas']),
+        'top_farm_html': (lambda df, areas: CRA.top_farm_areas(_engine, df, selected_bank, selected_year, areas).as_raw_html(), ['df', 'overall_areas']),
+    })
+    return tuple(results[name] for name in ['df', 'loan_dist_html', 'inside_out_html', 'top_areas_html', 'top_bus_html', 'top_farm_html'])
+
+# The report behind each option and the table that renders it
+option_reports = {
+    'Loan Distribution Table': 'loan_dist',
+    'Assessment Area Distribution Table': 'inside_out',
+    'Borrower Income Table': 'bor_income',
+    'Tract Income Table': 'tract_income',
+    'Business Tract Data': 'business',
+    'Business Size Data': 'business_size',
+    'Residential Demographics': 'demographics',
+    'Business Demographics': 'bus_demographics'
+}
+option_tables = {
+    'Loan Distribution Table': lambda df, selected_bank, selected_area: CRA.create_loan_distribution_great_tables(df, selected_area, selected_bank),
+    'Assessment Area Distribution Table': CRA.create_inside_out_great_table,
+    'Borrower Income Table': CRA.bor_income_table,
+    'Tract Income Table': CRA.tract_income_table,
+    'Business Tract Data': CRA.business_tract_table,
+    'Business Size Data': CRA.business_size_table,
+    'Residential Demographics': CRA.demographics_table,
+    'Business Demographics': CRA.business_demographics_table
+}
+
+@st.cache_data(ttl=cache_ttl, max_entries=256)
+def cached_area_reports(_source, selected_bank, selected_year, selected_area, codes):
+    # Every custom report for the area in one query. They only use column totals, so each
+    # is a single summed row and fetching all of them costs no more than fetching one.
+    md_code, msa_code, state_code, county_code, lookup_method = codes
+    return Q.fetch_reports(_source, list(option_reports.values()), selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=True)
+
+@st.cache_data(ttl=cache_ttl, max_entries=1024)
+def cached_report_html(_source, option, selected_bank, selected_year, selected_area, codes):
+    df = cached_area_reports(_source, selected_bank, selected_year, selected_area, codes)[option_reports[option]]
+    dataset = option_tables[option](df, selected_bank, selected_area)
+    if dataset is not None:  # Ensure dataset is not None
+        return dataset.as_raw_html()
+    return ""
+
+# Adding or removing a table reruns only this part of the page. Tables already shown come
+# back from cached_report_html, so only a newly selected one is rendered.
+@st.fragment
+def custom_reports(selected_bank, selected_year, selected_area, codes):
+    options = list(option_reports)
+    selected_options = st.multiselect('Select the graphs and tables you want to display:', options)
+    st.markdown(f'''
+    <style>
+        .summary-header {{
+            font-size: 2em;
+            font-weight: bold;
+            text-align: center;
+            margin-bottom: 20px;
+        }}
+        .summary-subheader {{
+            font-size: 1.5em;
+            font-weight: bold;
+            text-align: center;
+            margin-bottom: 10px;
+        }}
+        .summary-key {{
+            font-weight: bold;
+        }}
+    </style>
+    <div class="summary-header">Custom CRA Data</div>
+    <div class="summary-subheader">
+        <p><span class="summary-subheader">Institution: {selected_bank}</span></p>
+        <p><span class="summary-subheader">Year: {selected_year}</span></p>
+        <p><span class="summary-subheader">Location: {selected_area}</span></p>
+    </div>
+    ''', unsafe_allow_html=True)
+
+    html_content_dict = {}
+
+    # Display the selected graphs and tables, alternating between two columns
+    if selected_options:
+        columns = st.columns(2)
+    for index, option in enumerate(selected_options):
+        result = cached_report_html(source, option, selected_bank, selected_year, selected_area, codes)
+        with columns[index % 2]:
+            st.html(result)
+        html_content_dict[option] = result  # Store the HTML content
+
+    disclaimer2_html = '''
+    <style>
+        .disclaimer {
+            font-size: 0.9em;
+            margin-top: 40px;
+            border-top: 1px solid #ddd;
+            padding-top: 10px;
+            text-align: center;
+            color: #555;
+        }
+
+    </style>
+
+    <div class="separator"></div>
+    <div class="disclaimer">
+        <p><strong>Disclaimer:</strong></p>
+        <p>The banking and financial data used in this report is sourced from the <a href="https://www.federalreserve.gov/consumerscommunities/data_tables.htm" target="_blank">Federal Reserve</a>.</p>
+        <p>Geographical data is sourced from the <a href="https://www.ffiec.gov/" target="_blank">FFIEC</a>.</p>
+        <p>There may be slight deviations in the data due to different fiscal year timings for individual banks and the Federal Reserve data is categorized by activity within the calendar year.</p>
+        <p>While every effort is made to ensure accuracy, please verify any critical information with official sources or consult a financial expert.</p>
+    </div>
+    '''
+
+    # Add the disclaimer and separator before displaying the charts and tables
+    st.markdown(disclaimer2_html, unsafe_allow_html=True)
+
+    fmt.generate_html_export(html_content_dict, selected_bank, selected_year, selected_area)
+
+
 years = ['Select...', '2018', '2019', '2020', '2021']
 selected_year = st.selectbox('Select an exam year', options=years)
 
@@ -20,7 +178,7 @@ else:
 
 if selected_year != 'Select...':
     # Create a dropdown menu for bank names
-    bank_names = ['Select...'] + sorted(SQL.fetch_bank_names_for_year(engine, selected_year))
+    bank_names = cached_bank_names(source, selected_year)
     selected_bank = st.selectbox('Select an Institution', options=bank_names)
 
     if selected_bank != 'Select...':
@@ -28,8 +186,8 @@ if selected_year != 'Select...':
         report_type = st.radio('Select report type', ['Overall', 'Custom Reports by Region'])
 
         if report_type == 'Overall':
-            # Fetch data
-            df = SQL.fetch_loan_data_overall(engine, selected_bank, selected_year)
+            # Fetch data and generate HTML for tables
+            df, loan_dist_html, inside_out_html, top_areas_html, top_bus_html, top_farm_html = cached_overall_report(source, engine, selected_bank, selected_year)
             
             # Summarize data
             first_row = df.head(1).to_dict(as_series=True)
@@ -190,22 +348,6 @@ if selected_year != 'Select...':
             
             st.markdown(summary, unsafe_allow_html=True)
 
-            
-            overall_areas = assessment_areas = SQL.fetch_assessment_area(engine, selected_bank, selected_year)
-        # Generate HTML for tables
-            loan_dist = CRA.overall_distribution_great_tables(df, selected_bank)
-            inside_out = CRA.overall_inside_out_great_table(df, selected_bank)
-            top_areas = CRA.top_areas(engine, df, selected_bank, selected_year, overall_areas)
-            top_bus = CRA.top_business_areas(engine, df, selected_bank, selected_year, overall_areas)
-            top_farm = CRA.top_farm_areas(engine, df, selected_bank, selected_year, overall_areas)
-
-            # Convert to HTML
-            loan_dist_html = loan_dist.as_raw_html()
-            inside_out_html = inside_out.as_raw_html()
-            top_areas_html = top_areas.as_raw_html()
-            top_bus_html = top_bus.as_raw_html()
-            top_farm_html = top_farm.as_raw_html()
-
             # Display in Streamlit
             col1, col2 = st.columns([1, 2])
             with col1:
@@ -237,11 +379,9 @@ if selected_year != 'Select...':
             fmt.export_report(summary, loan_dist_html, inside_out_html, top_areas_html, top_bus_html, top_farm_html, selected_bank, selected_year)
 
         else:
-            selected_options = []  # Initialize selected_options to an empty list
-            assessment_areas = SQL.fetch_assessment_area(engine, selected_bank, selected_year)
+            assessment_areas = cached_assessment_areas(source, selected_bank, selected_year)
 
             if assessment_areas is None:
-                assessment_areas = {'No assessment areas found': {'codes': ('nan', 'nan', 'nan', 'nan', 'nan'), 'lookup_method': 'nan'}}
                 st.write("No assessment areas found for the selected bank and year.")
             else:
                 sorted_areas = fmt.group_and_sort_assessment_areas(assessment_areas.keys())
@@ -249,159 +389,4 @@ if selected_year != 'Select...':
                 # Create a dropdown menu for assessment areas, default to the first item
                 if sorted_areas:
                     selected_area = st.selectbox('Select an assessment area', options=sorted_areas, index=0)
-                    md_code, msa_code, state_code, county_code, lookup_method = assessment_areas[selected_area]['codes']
-
-                    options = ['Loan Distribution Table', 'Assessment Area Distribution Table', 'Borrower Income Table', 'Tract Income Table', 'Business Tract Data', 'Business Size Data', 'Residential Demographics', 'Business Demographics']
-                    selected_options = st.multiselect('Select the graphs and tables you want to display:', options)
-                    st.markdown(f'''
-                    <style>
-                        .summary-header {{
-                            font-size: 2em;
-                            font-weight: bold;
-                            text-align: center;
-                            margin-bottom: 20px;
-                        }}
-                        .summary-subheader {{
-                            font-size: 1.5em;
-                            font-weight: bold;
-                            text-align: center;
-                            margin-bottom: 10px;
-                        }}
-                        .summary-key {{
-                            font-weight: bold;
-                        }}
-                    </style>
-                    <div class="summary-header">Custom CRA Data</div>
-                    <div class="summary-subheader">
-                        <p><span class="summary-subheader">Institution: {selected_bank}</span></p>
-                        <p><span class="summary-subheader">Year: {selected_year}</span></p>
-                        <p><span class="summary-subheader">Location: {selected_area}</span></p>
-                    </div>
-                    ''', unsafe_allow_html=True)
-
-                # Function to create Great Tables table
-                def create_great_tables_table():
-                    df = SQL.fetch_loan_data_loan_dist(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code)
-                    dataset = CRA.create_loan_distribution_great_tables(df, selected_area, selected_bank)
-                    if dataset is not None:  # Ensure dataset is not None
-                        return dataset.as_raw_html()
-                    return ""
-
-                def create_inside_out_table():
-                    df = SQL.fetch_loan_data_inside_out(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code)
-                    dataset = CRA.create_inside_out_great_table(df, selected_bank, selected_area)
-                    if dataset is not None:  # Ensure dataset is not None
-                        return dataset.as_raw_html()
-                    return ""
-
-                def create_bor_income_table():
-                    df = SQL.fetch_loan_data_bor_income(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code)
-                    dataset = CRA.bor_income_table(df, selected_bank, selected_area)
-                    if dataset is not None:  # Ensure dataset is not None
-                        return dataset.as_raw_html()
-                    return ""
-
-                def create_tract_income_table():
-                    df = SQL.fetch_loan_data_tract_income(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code)
-                    dataset = CRA.tract_income_table(df, selected_bank, selected_area)
-                    if dataset is not None:  # Ensure dataset is not None
-                        return dataset.as_raw_html()
-                    return ""
-
-                def create_tract_business_table():
-                    df = SQL.fetch_loan_data_business(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code)
-                    dataset = CRA.business_tract_table(df, selected_bank, selected_area)
-                    if dataset is not None:  # Ensure dataset is not None
-                        return dataset.as_raw_html()
-                    return ""
-
-                def create_business_size_table():
-                    df = SQL.fetch_loan_business_size(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code)
-                    dataset = CRA.business_size_table(df, selected_bank, selected_area)
-                    if dataset is not None:  # Ensure dataset is not None
-                        return dataset.as_raw_html()
-                    return ""
-
-                def create_demographics_table():
-                    df = SQL.fetch_demographics(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code)
-                    dataset = CRA.demographics_table(df, selected_bank, selected_area)
-                    if dataset is not None:  # Ensure dataset is not None
-                        return dataset.as_raw_html()
-                    return ""
-
-                def create_business_demographics_table():
-                    df = SQL.fetch_bus_demographics(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code)
-                    dataset = CRA.business_demographics_table(df, selected_bank, selected_area)
-                    if dataset is not None:  # Ensure dataset is not None
-                        return dataset.as_raw_html()
-                    return ""
-                
-                html_content_dict = {}
-
-                # Display the selected graphs and tables
-                columns = [None, None]
-                column_index = 0
-
-                # Function to set up columns if needed
-                def setup_columns():
-                    global columns
-                    if columns[0] is None:
-                        columns = st.columns(2)
-
-                # Display the selected graphs and tables
-                for option in selected_options:
-                    # Set up columns if they haven't been set up
-                    setup_columns()
-                    
-                    if option == 'Loan Distribution Table':
-                        result = create_great_tables_table()
-                    elif option == 'Borrower Income Table':
-                        result = create_bor_income_table()
-                    elif option == 'Tract Income Table':
-                        result = create_tract_income_table()
-                    elif option == 'Business Tract Data':
-                        result = create_tract_business_table()
-                    elif option == 'Business Size Data':
-                        result = create_business_size_table()
-                    elif option == 'Residential Demographics':
-                        result = create_demographics_table()
-                    elif option == 'Business Demographics':
-                        result = create_business_demographics_table()
-                    elif option == 'Assessment Area Distribution Table':
-                        result = create_inside_out_table()
-
-                    if result is not None:
-                        with columns[column_index]:
-                            st.html(result)
-                        html_content_dict[option] = result  # Store the HTML content
-                    
-                    # Update column index
-                    column_index = (column_index + 1) % 2
-
-                disclaimer2_html = '''
-                <style>
-                    .disclaimer {
-                        font-size: 0.9em;
-                        margin-top: 40px;
-                        border-top: 1px solid #ddd;
-                        padding-top: 10px;
-                        text-align: center;
-                        color: #555;
-                    }
-
-                </style>
-
-                <div class="separator"></div>
-                <div class="disclaimer">
-                    <p><strong>Disclaimer:</strong></p>
-                    <p>The banking and financial data used in this report is sourced from the <a href="https://www.federalreserve.gov/consumerscommunities/data_tables.htm" target="_blank">Federal Reserve</a>.</p>
-                    <p>Geographical data is sourced from the <a href="https://www.ffiec.gov/" target="_blank">FFIEC</a>.</p>
-                    <p>There may be slight deviations in the data due to different fiscal year timings for individual banks and the Federal Reserve data is categorized by activity within the calendar year.</p>
-                    <p>While every effort is made to ensure accuracy, please verify any critical information with official sources or consult a financial expert.</p>
-                </div>
-                '''
-
-                # Add the disclaimer and separator before displaying the charts and tables
-                st.markdown(disclaimer2_html, unsafe_allow_html=True)
-
-                fmt.generate_html_export(html_content_dict, selected_bank, selected_year, selected_area)
+                    custom_reports(selected_bank, selected_year, selected_area, assessment_areas[selected_area]['codes'])
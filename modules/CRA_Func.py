@@ -1452,76 +1452,6 @@ def overall_inside_out_great_table(df, selected_bank):
 )
     return gt_instance
 
-def fetch_assessment_area(engine, selected_bank, selected_year):
-    query = f"SELECT MD_Code, MSA_Code, State_Code, County_Code FROM Retail_Table WHERE id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') AND ActivityYear = {selected_year};"
-    df = pl.read_database(query, engine)
-    #print(f"Initial query result: {df}")
-
-    assessment_areas = {}
-
-    for row in df.iter_rows():
-        md_code, msa_code, state_code, county_code = row
-        lookup_method = None  # Reset lookup_method at the start of each loop iteration
-        #print(f"Lookup method reset to: {lookup_method}")
-        skip_row = False  # Reset skip_row at the start of each loop iteration
-
-        # Look up by MD_Code first
-        if md_code is not None and md_code != 'NA':
-                #print(f"MD_Code: {md_code}")
-                for table in ['2024 tracts', '2022-2023 tracts']:
-                    query = f"SELECT `MSA/MD name` FROM `{table}` WHERE `MSA/MD Code` = '{md_code}';"
-                    df = pl.read_database(query, engine)
-                    if df.height != 0:
-                        area_name = df['MSA/MD name'][0]
-                        lookup_method = 'md'
-                        assessment_areas[area_name] = {'codes': (md_code, msa_code, state_code, county_code, 'md')}
-                        #print(f"Used MD_Code {md_code} to look up MSA/MD name {area_name}. Lookup method: {lookup_method}")
-                        skip_row = True  # Set skip_row to True if MD_Code lookup was successful
-                        break
-
-        # If MD_Code lookup was successful, skip the rest of the current row
-        if skip_row:
-            #print(f"Skipping row due to successful MD_Code lookup. Current lookup method: {lookup_method}")
-            continue
-
-        # If MD_Code lookup failed, try MSA_Code
-        if msa_code is not None and msa_code != 'NA':
-                #print(f"MSA_Code: {msa_code}")
-                for table in ['2024 tracts', '2022-2023 tracts']:
-                    query = f"SELECT `MSA/MD name` FROM `{table}` WHERE `MSA/MD Code` = '{msa_code}';"
-                    df = pl.read_database(query, engine)
-                    if df.height != 0:
-                        area_name = df['MSA/MD name'][0]
-                        lookup_method = 'msa' 
-                        assessment_areas[area_name] = {'codes': (md_code, msa_code, state_code, county_code, 'msa')}
-                        #print(f"Used MSA_Code {msa_code} to look up MSA/MD name {area_name}. Lookup method: {lookup_method}")
-                        break
-
-        #print(f"After MSA_Code lookup, current lookup method: {lookup_method}")
-
-        # If both MD_Code and MSA_Code lookups failed, try State_Code and County_Code
-        if lookup_method != 'md' and lookup_method != 'msa' and str(state_code).isdigit() and str(county_code).isdigit():
-            state_code, county_code = map(int, (state_code, county_code))
-            #print(f"Looking up by State_Code: {state_code} and County_Code: {county_code}")
-            for table in ['2024 tracts', '2022-2023 tracts']:
-                query = f"SELECT `County name`, `State` FROM `{table}` WHERE `State code` = {state_code} AND `County code` = {county_code};"
-                df = pl.read_database(query, engine)
-                if df.height != 0:
-                    area_name = f"{df['County name'][0]}, {df['State'][0]}"
-                    lookup_method = 'state_county' 
-                    assessment_areas[area_name] = {'codes': (md_code, msa_code, state_code, county_code, 'state_county')}
-                    #print(f"Used State_Code {state_code} and County_Code {county_code} to look up MSA/MD name {area_name}. Lookup method: {lookup_method}")
-
-        #print(f"After State_Code and County_Code lookup, current lookup method: {lookup_method}")
-
-    if not assessment_areas:
-        print("No matching records found")
-        return None
-    
-    print(f"Assessment areas found: {assessment_areas}")
-    
-    return assessment_areas
-
 def create_mapping_dict(assessment_areas):
     code_to_area = {}
     
@@ -1545,38 +1475,35 @@ def create_mapping_dict(assessment_areas):
     return code_to_area
 
 def map_area_names(df, code_to_area):
-    # Function to get area name based on codes
-    def get_area_name(md_code, msa_code, state_code, county_code):
-        # Check MD_Code
-        if md_code in code_to_area:
-            return code_to_area[md_code]
-
-        # Check MSA_Code
-        if msa_code in code_to_area:
-            return code_to_area[msa_code]
-
-        # Check State_Code and County_Code
-        if state_code and county_code:
-            state_county_key = (state_code, county_code)
-            if state_county_key in code_to_area:
-                return code_to_area[state_county_key]
-
-        return None
+    # The lookup as frames: MD and MSA codes share one, as they share the dict, and state and
+    # county pairs have their own. Codes are compared as text on both sides.
+    codes = pl.DataFrame(
+        [(str(code), area) for code, area in code_to_area.items() if not isinstance(code, tuple)],
+        schema={'code': pl.Utf8, 'area': pl.Utf8}, orient='row'
+    ).unique(subset='code', keep='first', maintain_order=True)
+    counties = pl.DataFrame(
+        [(str(code[0]), str(code[1]), area) for code, area in code_to_area.items() if isinstance(code, tuple)],
+        schema={'state': pl.Utf8, 'county': pl.Utf8, 'county_area': pl.Utf8}, orient='row'
+    ).unique(subset=['state', 'county'], keep='first', maintain_order=True)
+
+    # Each row is named by its MD code, else its MSA code, else its state and county
+    keys = df.select(
+        pl.col('MD_Code').cast(pl.Utf8).alias('md'),
+        pl.col('MSA_Code').cast(pl.Utf8).alias('msa'),
+        pl.col('State_Code').cast(pl.Utf8).alias('state'),
+        pl.col('County_Code').cast(pl.Utf8).alias('county'),
+    )
+    area = (
+        keys
+        .join(codes.rename({'code': 'md', 'area': 'md_area'}), on='md', how='left', maintain_order='left')
+        .join(codes.rename({'code': 'msa', 'area': 'msa_area'}), on='msa', how='left', maintain_order='left')
+        .join(counties, on=['state', 'county'], how='left', maintain_order='left')
+        .select(pl.coalesce('md_area', 'msa_area', 'county_area'))
+        .to_series()
+    )
 
     # Apply mapping to create "Area" column
-    df = df.with_columns(
-        pl.struct(['MD_Code', 'MSA_Code', 'State_Code', 'County_Code']).map_elements(
-            lambda row: get_area_name(
-                row['MD_Code'], 
-                row['MSA_Code'], 
-                row['State_Code'], 
-                row['County_Code']
-            ),
-            return_dtype=pl.Utf8
-        ).alias('Area')
-    )
-    
-    return df
+    return df.with_columns(area.alias('Area'))
 
 def top_areas(engine, df, selected_bank, selected_year, overall_areas):
     code_to_area = create_mapping_dict(overall_areas)
@@ -0,0 +1,155 @@
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+import polars as pl
+
+from modules import Query_Cache
+from modules import SQL_Queries as SQL
+
+# The Parquet store written by `csv_to_db.py --target parquet`
+ParquetStore = namedtuple('ParquetStore', ['root'])
+
+def create_store_connection(root='parquet'):
+    return ParquetStore(root)
+
+def scan_table(store, table_name):
+    # Lazy scan over every part file of a table. ActivityYear is read from the partition
+    # directories, so year filters skip whole directories, and only the selected columns
+    # are ever decoded.
+    return pl.scan_parquet(os.path.join(store.root, table_name, '**', '*.parquet'), hive_partitioning=True)
+
+@lru_cache(maxsize=1024)
+def lookup_bank_ids(store, selected_bank, bank_fingerprint):
+    # Same as SQL.lookup_bank_ids: every id_rssd carrying this name, looked up once per name
+    # and version of the bank table
+    df = scan_table(store, 'bank').filter(pl.col('bank_name') == selected_bank).select('id_rssd').collect()
+    return tuple(df['id_rssd'].to_list())
+
+def bank_ids(store, selected_bank):
+    # The bank directory is recreated whenever csv_to_db.py rewrites the table
+    return lookup_bank_ids(store, selected_bank, Query_Cache.fingerprint(os.path.join(store.root, 'bank')))
+
+def leading_int(col):
+    # CAST(... AS INTEGER) as SQLite does it: '06' and '6.0' are both 6
+    return pl.col(col).str.extract(r'^\s*(\d+)', 1).cast(pl.Int64)
+
+def area_filter(lookup_method, md_code, msa_code, state_code, county_code):
+    if lookup_method == 'md':
+        return pl.col('MD_Code') == str(md_code)
+    elif lookup_method == 'msa':
+        return pl.col('MSA_Code') == str(msa_code)
+    else:  # lookup_method == 'state_county'
+        # Compared as integers, like SQL.area_predicates
+        return (leading_int('State_Code') == int(state_code)) & (leading_int('County_Code') == int(county_code))
+
+def scan_bank_year(store, selected_bank, selected_year):
+    return scan_table(store, 'Retail_Table').filter(
+        (pl.col('ActivityYear') == int(selected_year)) & pl.col('id_rssd').is_in(list(bank_ids(store, selected_bank)))
+    )
+
+def fetch_area_sums(store, report, selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code):
+    # None when the store predates the aggregate tables, so the caller sums the raw rows
+    if not os.path.isdir(os.path.join(store.root, f'agg_{report}')):
+        return None
+
+    # Summed across the bank's ids, as SQL.area_sums_statement does, so there is always one row
+    key = SQL.area_key(lookup_method, md_code, msa_code, state_code, county_code)
+    lf = scan_table(store, f'agg_{report}').filter(
+        (pl.col('ActivityYear') == int(selected_year))
+        & pl.col('id_rssd').is_in(list(bank_ids(store, selected_bank)))
+        & (pl.col('lookup_method') == lookup_method)
+        & (pl.col('area_key') == key)
+    )
+    return summed(lf, SQL.report_columns[report])
+
+def summed(lf, columns):
+    # Totals computed in the scan, matching SQL.summed_query: one row, zeros when nothing matches.
+    # A column stored as text (all NA where its type was inferred) is summed as numbers too.
+    schema = lf.collect_schema()
+    return lf.select([
+        pl.lit(None, dtype=pl.Utf8).alias(col) if col in SQL.text_columns
+        else pl.col(col).sum() if schema[col].is_numeric()
+        else pl.col(col).cast(pl.Float64, strict=False).sum()
+        for col in columns
+    ]).collect()
+
+def fetch_reports(store, reports, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    # Same contract as SQL.fetch_reports: one scan for the union of the reports' columns
+    reports = tuple(report for report in SQL.report_columns if report in set(reports))
+    if not reports:
+        return {}
+
+    if aggregate and all(os.path.isdir(os.path.join(store.root, f'agg_{report}')) for report in reports):
+        return {
+            report: fetch_area_sums(store, report, selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code)
+            for report in reports
+        }
+
+    # Predicates and the column list are pushed down into the Parquet reader
+    columns = SQL.union_columns(reports)
+    lf = scan_bank_year(store, selected_bank, selected_year)
+    lf = lf.filter(area_filter(lookup_method, md_code, msa_code, state_code, county_code))
+    if aggregate:
+        df = summed(lf, columns)
+    else:
+        df = lf.select(columns).collect()
+    return {report: df.select(SQL.report_columns[report]) for report in reports}
+
+def fetch_area_report(store, report, selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate=False):
+    return fetch_reports(store, [report], selected_bank, selected_year, md_code, msa_code, None, lookup_method, state_code, county_code, aggregate)[report]
+
+def fetch_bank_names_for_year(store, selected_year):
+    # The per-year catalog when the store has one, otherwise the ids in the year's partition
+    table_name = 'bank_catalog' if os.path.isdir(os.path.join(store.root, 'bank_catalog')) else 'Retail_Table'
+    ids = scan_table(store, table_name).filter(pl.col('ActivityYear') == int(selected_year)).select('id_rssd').unique()
+    df = scan_table(store, 'bank').join(ids, on='id_rssd', how='semi').select('bank_name').unique().sort('bank_name').collect()
+    return df['bank_name'].to_list()
+
+def fetch_assessment_area(store, selected_bank, selected_year):
+    # The same joins as the SQL backend, against the geography tables copied into the store
+    areas = scan_table(store, 'geo_area')
+    counties = scan_table(store, 'geo_county').rename({'state_code': 'state_key', 'county_code': 'county_key', 'area_name': 'county_name'})
+    is_code = pl.col('State_Code').str.contains(r'^[0-9]+$') & pl.col('County_Code').str.contains(r'^[0-9]+$')
+    df = (
+        scan_bank_year(store, selected_bank, selected_year)
+        .select(['MD_Code', 'MSA_Code', 'State_Code', 'County_Code'])
+        .unique(maintain_order=True)
+        .with_columns(
+            pl.when(is_code).then(pl.col('State_Code').cast(pl.Int64)).alias('state_key'),
+            pl.when(is_code).then(pl.col('County_Code').cast(pl.Int64)).alias('county_key'),
+        )
+        .join(areas.rename({'area_code': 'MD_Code', 'area_name': 'md_name'}), on='MD_Code', how='left', maintain_order='left')
+        .join(areas.rename({'area_code': 'MSA_Code', 'area_name': 'msa_name'}), on='MSA_Code', how='left', maintain_order='left')
+        .join(counties, on=['state_key', 'county_key'], how='left', maintain_order='left')
+        .select(['MD_Code', 'MSA_Code', 'State_Code', 'County_Code', 'md_name', 'msa_name', 'county_name'])
+        .collect()
+    )
+    return SQL.name_assessment_areas(df)
+
+def fetch_loan_data_overall(store, selected_bank, selected_year):
+    return scan_bank_year(store, selected_bank, selected_year).select(SQL.report_columns['overall']).collect()
+
+def fetch_loan_data_loan_dist(store, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    return fetch_area_report(store, 'loan_dist', selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate)
+
+def fetch_loan_data_inside_out(store, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    return fetch_area_report(store, 'inside_out', selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate)
+
+def fetch_loan_data_bor_income(store, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    return fetch_area_report(store, 'bor_income', selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate)
+
+def fetch_loan_data_tract_income(store, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    return fetch_area_report(store, 'tract_income', selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate)
+
+def fetch_loan_data_business(store, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    return fetch_area_report(store, 'business', selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate)
+
+def fetch_loan_business_size(store, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    return fetch_area_report(store, 'business_size', selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate)
+
+def fetch_demographics(store, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    return fetch_area_report(store, 'demographics', selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate)
+
+def fetch_bus_demographics(store, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    return fetch_area_report(store, 'bus_demographics', selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate)
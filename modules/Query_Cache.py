@@ -0,0 +1,136 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import polars as pl
+
+# Result frames are kept in memory up to this many bytes, least recently used dropped first
+max_bytes = int(os.environ.get('CRA_CACHE_BYTES', 256 * 1024 * 1024))
+
+# Set CRA_CACHE_DIR to also keep every result as an Arrow IPC file, shared by every process
+# and kept across restarts. Files are named by database, database version and key, so a
+# reloaded database never reads old ones, and the directory can be emptied at any time.
+# Files from older versions of a database are deleted as new ones are written, and the
+# directory is kept under max_disk_bytes by deleting the least recently used files.
+cache_dir = os.environ.get('CRA_CACHE_DIR')
+max_disk_bytes = int(os.environ.get('CRA_CACHE_DISK_BYTES', 2 * 1024 * 1024 * 1024))
+
+entries = OrderedDict()
+counters = {'hits': 0, 'misses': 0, 'bytes': 0}
+lock = threading.Lock()
+
+def fingerprint(path):
+    # Changes whenever csv_to_db.py rewrites the database
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+def normalize(value):
+    # Lists and tuples of the same values give the same key
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(item) for item in value)
+    return value
+
+def digest(value, length=None):
+    return hashlib.sha1(repr(value).encode()).hexdigest()[:length]
+
+def cache_key(query, params, db_fingerprint):
+    # The SQL text, its bound values in name order and the database it ran against, after
+    # a prefix naming the database and its version
+    path, *version = db_fingerprint
+    values = tuple(sorted((name, normalize(value)) for name, value in params.items()))
+    return f'{digest(path, 12)}-{digest(version, 12)}-{digest((query, values, db_fingerprint))}'
+
+def disk_path(key):
+    return os.path.join(cache_dir, f'{key}.arrow')
+
+def get(key):
+    # The cached frame, or None. Hits from disk are promoted into memory.
+    with lock:
+        if key in entries:
+            entries.move_to_end(key)
+            counters['hits'] += 1
+            return entries[key].clone()
+
+    if cache_dir and os.path.exists(disk_path(key)):
+        try:
+            df = pl.read_ipc(disk_path(key))
+            # Touched on every hit, so pruning drops the least recently used files first
+            os.utime(disk_path(key))
+        except FileNotFoundError:
+            df = None  # Pruned by another process in the meantime
+        if df is not None:
+            with lock:
+                counters['hits'] += 1
+            remember(key, df)
+            return df.clone()
+
+    with lock:
+        counters['misses'] += 1
+    return None
+
+def remember(key, df):
+    size = df.estimated_size()
+    if size > max_bytes:
+        return
+
+    with lock:
+        if key in entries:
+            counters['bytes'] -= entries.pop(key).estimated_size()
+        entries[key] = df
+        counters['bytes'] += size
+        while counters['bytes'] > max_bytes:
+            _, evicted = entries.popitem(last=False)
+            counters['bytes'] -= evicted.estimated_size()
+
+def put(key, df):
+    remember(key, df)
+
+    if cache_dir:
+        # Written under a temporary name and renamed, so a reader never sees half a file
+        os.makedirs(cache_dir, exist_ok=True)
+        partial = f'{disk_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp'
+        df.write_ipc(partial)
+        os.replace(partial, disk_path(key))
+        prune_disk(key)
+
+def prune_disk(key):
+    # Delete the files of older versions of this key's database, then the least recently
+    # used files until the directory fits in max_disk_bytes
+    database, version, _ = key.split('-')
+    files = []
+    for entry in os.scandir(cache_dir):
+        if not entry.name.endswith('.arrow'):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        parts = entry.name.split('-')
+        if len(parts) == 3 and parts[0] == database and parts[1] != version:
+            remove_file(entry.path)
+        else:
+            files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_disk_bytes:
+            break
+        remove_file(path)
+        total -= size
+
+def remove_file(path):
+    # Another process may be pruning the same directory
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def stats():
+    with lock:
+        return {**counters, 'entries': len(entries)}
+
+def clear():
+    with lock:
+        entries.clear()
+        counters.update(hits=0, misses=0, bytes=0)
@@ -1,1126 +1,399 @@
-import polars as pl
-from sqlalchemy import create_engine, text
+import atexit
+import os
+import threading
+from functools import lru_cache
+from queue import Empty, SimpleQueue
 
+import polars as pl
+from sqlalchemy import bindparam, create_engine, inspect, text
+from sqlalchemy.pool import QueuePool
+
+from modules import Query_Cache
+
+# Columns each report reads from Retail_Table, shared by every query backend
+report_columns = {
+    'loan_dist': [
+        'Amt_Orig_SFam_Closed', 'Amt_Orig_SFam_Open', 'Amt_Orig_MFam', 'SF_Amt_Orig', 'SB_Amt_Orig', 'Amt_Orig',
+        'Partial_Ind', 'State_Code', 'County_Code'
+    ],
+    'inside_out': [
+        'Loan_Orig_SFam_Closed_Inside', 'Loan_Orig_SFam_Open_Inside', 'Loan_Orig_MFam_Inside', 'SB_Loan_Orig_Inside',
+        'SF_Loan_Orig_Inside', 'Amt_Orig_SFam_Closed_Inside', 'Amt_Orig_SFam_Open_Inside', 'Amt_Orig_MFam_Inside',
+        'SB_Amt_Orig_Inside', 'SF_Amt_Orig_Inside', 'Loan_Orig_SFam_Closed', 'Loan_Orig_SFam_Open', 'Loan_Orig_MFam',
+        'SB_Loan_Orig', 'SF_Loan_Orig', 'Amt_Orig_SFam_Closed', 'Amt_Orig_SFam_Open', 'Amt_Orig_MFam', 'Amt_Orig',
+        'SB_Amt_Orig', 'SF_Amt_Orig', 'State_Code', 'County_Code'
+    ],
+    'bor_income': [
+        'Loan_Orig_SFam_Closed_BILow', 'Loan_Orig_SFam_Closed_BIMod', 'Loan_Orig_SFam_Closed',
+        'Loan_Orig_SFam_Open_BILow', 'Loan_Orig_SFam_Open_BIMod', 'Loan_Orig_SFam_Open', 'Loan_Orig_BILow',
+        'Loan_Orig_BIMod', 'Loan_Orig', 'Agg_Loan_Orig_SFam_Closed_BILow', 'Agg_Loan_Orig_SFam_Closed_BIMod',
+        'Agg_Loan_Orig_SFam_Closed', 'Agg_Loan_Orig_SFam_Open_BILow', 'Agg_Loan_Orig_SFam_Open_BIMod',
+        'Agg_Loan_Orig_SFam_Open', 'Agg_Loan_Orig_BILow', 'Agg_Loan_Orig_BIMod', 'Agg_Loan_Orig',
+        'Amt_Orig_SFam_Closed_BILow', 'Amt_Orig_SFam_Closed_BIMod', 'Amt_Orig_SFam_Closed',
+        'Amt_Orig_SFam_Open_BILow', 'Amt_Orig_SFam_Open_BIMod', 'Amt_Orig_SFam_Open', 'Amt_Orig_BILow',
+        'Amt_Orig_BIMod', 'Amt_Orig', 'Agg_Amt_Orig_SFam_Closed_BILow', 'Agg_Amt_Orig_SFam_Closed_BIMod',
+        'Agg_Amt_Orig_SFam_Closed', 'Agg_Amt_Orig_SFam_Open_BILow', 'Agg_Amt_Orig_SFam_Open_BIMod',
+        'Agg_Amt_Orig_SFam_Open', 'Agg_Amt_Orig_BIMod', 'Agg_Amt_Orig_BILow', 'Agg_Amt_Orig', 'State_Code',
+        'County_Code'
+    ],
+    'tract_income': [
+        'Loan_Orig_SFam_Closed', 'Loan_Orig_SFam_Open', 'Loan_Orig', 'Agg_Loan_Orig_SFam_Closed',
+        'Agg_Loan_Orig_SFam_Open', 'Agg_Loan_Orig', 'Amt_Orig_SFam_Closed', 'Amt_Orig_SFam_Open', 'Amt_Orig',
+        'Agg_Amt_Orig_SFam_Closed', 'Agg_Amt_Orig_SFam_Open', 'Agg_Amt_Orig', 'Loan_Orig_SFam_Closed_TILow',
+        'Loan_Orig_SFam_Closed_TIMod', 'Loan_Orig_SFam_Open_TILow', 'Loan_Orig_SFam_Open_TIMod',
+        'Loan_Orig_MFam_TILow', 'Loan_Orig_MFam_TIMod', 'Loan_Orig_MFam', 'Loan_Orig_TILow', 'Loan_Orig_TIMod',
+        'Agg_Loan_Orig_SFam_Closed_TILow', 'Agg_Loan_Orig_SFam_Closed_TIMod', 'Agg_Loan_Orig_SFam_Open_TILow',
+        'Agg_Loan_Orig_SFam_Open_TIMod', 'Agg_Loan_Orig_MFam_TILow', 'Agg_Loan_Orig_MFam_TIMod', 'Agg_Loan_Orig_MFam',
+        'Agg_Loan_Orig_TILow', 'Agg_Loan_Orig_TIMod', 'Amt_Orig_SFam_Closed_TILow', 'Amt_Orig_SFam_Closed_TIMod',
+        'Amt_Orig_SFam_Open_TILow', 'Amt_Orig_SFam_Open_TIMod', 'Amt_Orig_MFam_TILow', 'Amt_Orig_MFam_TIMod',
+        'Amt_Orig_MFam', 'Amt_Orig_TILow', 'Amt_Orig_TIMod', 'Agg_Amt_Orig_SFam_Closed_TILow',
+        'Agg_Amt_Orig_SFam_Closed_TIMod', 'Agg_Amt_Orig_SFam_Open_TILow', 'Agg_Amt_Orig_SFam_Open_TIMod',
+        'Agg_Amt_Orig_MFam_TILow', 'Agg_Amt_Orig_MFam_TIMod', 'Agg_Amt_Orig_MFam', 'Agg_Amt_Orig_TILow',
+        'Agg_Amt_Orig_TIMod', 'State_Code', 'County_Code'
+    ],
+    'business': [
+        'SB_Loan_Orig_TILow', 'SB_Loan_Orig_TIMod', 'SB_Loan_Orig', 'Agg_SB_Loan_Purch_TILow',
+        'Agg_SB_Loan_Orig_TIMod', 'Agg_SB_Loan_Orig', 'SF_Loan_Orig_TILow', 'SF_Loan_Orig_TIMod', 'SF_Loan_Orig',
+        'Agg_SF_Loan_Orig_TILow', 'Agg_SF_Loan_Orig_TIMod', 'Agg_SF_Loan_Orig', 'State_Code', 'County_Code'
+    ],
+    'business_size': [
+        'SB_Loan_Orig_GAR_less_1m', 'SB_Loan_Orig', 'SF_Loan_Orig_GAR_less_1m', 'SF_Loan_Orig',
+        'Agg_SB_Loan_Orig_GAR_less_1m', 'Agg_SB_Loan_Orig', 'Agg_SF_Loan_Orig_GAR_less_1m', 'Agg_SF_Loan_Orig',
+        'State_Code', 'County_Code'
+    ],
+    'demographics': [
+        'Owner_Occupied_Units_TILow_Inside', 'Owner_Occupied_Units_TIMod_Inside', 'Owner_Occupied_Units_Inside',
+        'Total5orMoreHousingUnitsInStructure_TILow_Inside', 'Total5orMoreHousingUnitsInStructure_TIMod_Inside',
+        'Total5orMoreHousingUnitsInStructure_Inside', 'Low_Income_Family_Count_Inside',
+        'Moderate_Income_Family_Count_Inside', 'Family_Count_Inside', 'Owner_Occupied_Units_TILow',
+        'Owner_Occupied_Units_TIMod', 'Owner_Occupied_Units', 'Total5orMoreHousingUnitsInStructure_TILow',
+        'Total5orMoreHousingUnitsInStructure_TIMod', 'Total5orMoreHousingUnitsInStructure', 'Low_Income_Family_Count',
+        'Moderate_Income_Family_Count', 'Family_Count', 'State_Code', 'County_Code'
+    ],
+    'bus_demographics': [
+        'Establishments_Small_Business_TILow_Inside', 'Establishments_Small_Business_TIMod_Inside',
+        'Establishments_Small_Business_Inside', 'Establishments_GAR_Less_1M_Small_Business_Inside',
+        'Establishments_GAR_1_to_250k_Small_Business_Inside', 'Establishments_GAR_250k_to_1M_Small_Business_Inside',
+        'Establishments_Small_Farm_TILow_Inside', 'Establishments_Small_Farm_TIMod_Inside',
+        'Establishments_Small_Farm_Inside', 'Establishments_GAR_Less_1M_Small_Farm_Inside',
+        'Establishments_GAR_1_to_250k_Small_Farm_Inside', 'Establishments_GAR_250k_to_1M_Small_Farm_Inside',
+        'Establishments_Small_Business_TILow', 'Establishments_Small_Business_TIMod', 'Establishments_Small_Business',
+        'Establishments_GAR_Less_1M_Small_Business', 'Establishments_GAR_1_to_250k_Small_Business',
+        'Establishments_GAR_250k_to_1M_Small_Business', 'Establishments_Small_Farm_TILow',
+        'Establishments_Small_Farm_TIMod', 'Establishments_Small_Farm', 'Establishments_GAR_Less_1M_Small_Farm',
+        'Establishments_GAR_1_to_250k_Small_Farm', 'Establishments_GAR_250k_to_1M_Small_Farm', 'State_Code',
+        'County_Code'
+    ],
+    'overall': [
+        'cra_current_year_assets', 'cra_previous_year_assets', 'hmda_assets', 'number_of_branches',
+        'bank_county_deposits', 'Lender_in_CRA', 'Lender_in_HMDA', 'id_rssd', 'Amt_Orig_SFam_Closed',
+        'Amt_Orig_SFam_Open', 'Amt_Orig_MFam', 'SF_Amt_Orig', 'SB_Amt_Orig', 'SB_Loan_Orig', 'SF_Loan_Orig',
+        'Amt_Orig', 'Partial_Ind', 'Loan_Orig_SFam_Closed_Inside', 'Loan_Orig_SFam_Open_Inside',
+        'Loan_Orig_MFam_Inside', 'SB_Loan_Orig_Inside', 'SF_Loan_Orig_Inside', 'Amt_Orig_SFam_Closed_Inside',
+        'Amt_Orig_SFam_Open_Inside', 'Amt_Orig_MFam_Inside', 'SB_Amt_Orig_Inside', 'SF_Amt_Orig_Inside',
+        'Loan_Orig_SFam_Closed', 'Loan_Orig_SFam_Open', 'Loan_Orig_MFam', 'Loan_Orig', 'MSA_Code', 'MD_Code',
+        'State_Code', 'County_Code'
+    ],
+}
+
+# Retail_Table columns stored as text, which are never summed
+text_columns = ['id_rssd', 'Lender_in_CRA', 'Lender_in_HMDA', 'MSA_Code', 'MD_Code', 'State_Code', 'County_Code', 'Partial_Ind']
+
+# Geography predicate for each assessment area lookup method. State and county codes are
+# compared as integers, so '06' and '6' both match the codes fetch_assessment_area returns.
+area_predicates = {
+    'md': "MD_Code = :md_code",
+    'msa': "MSA_Code = :msa_code",
+    'state_county': "CAST(State_Code AS INTEGER) = :state_code AND CAST(County_Code AS INTEGER) = :county_code",
+}
+
+# Every query is for one bank-year. The bank's ids are resolved from its name once, by
+# resolve_bank_ids, and bound as a list so the id_rssd indexes are used directly.
+bank_predicate = "id_rssd IN :bank_ids AND ActivityYear = :selected_year"
+
+# Optional Arrow-native reads, used when the driver is installed
+try:
+    import adbc_driver_sqlite.dbapi as adbc_sqlite
+except ImportError:
+    adbc_sqlite = None
+
+# Arrow connection pool by database URI (checkout slots and idle connections), and every
+# connection opened, to close at exit
+arrow_pools = {}
+arrow_connections = []
+
+# Connections kept open by the shared engine, so concurrent sessions reuse warm connections
+# (and their page caches) instead of reopening the file
+pool_size = int(os.environ.get('CRA_DB_POOL_SIZE', 5))
+
+@lru_cache(maxsize=None)
 def create_db_connection():
-    # Create a connection engine to the SQLite database
-    return create_engine('sqlite:///my_database.db')
-
-def fetch_bank_names_for_year(engine, selected_year):
-    # Query the id_rssd for the selected year from the Retail_Table
-    query = f"SELECT DISTINCT id_rssd FROM Retail_Table WHERE ActivityYear = {selected_year};"
-    df = pl.read_database(query=query, connection=engine.connect())
-    id_rssd_list = df['id_rssd'].unique().to_list()
-
-    # Query the bank names for the selected id_rssd from the PE_Table
-    query = f"SELECT DISTINCT bank_name FROM PE_Table WHERE id_rssd IN ({', '.join(map(str, id_rssd_list))});"
-    df = pl.read_database(query=query, connection=engine.connect())
-    return df['bank_name'].unique().to_list()
-
-def fetch_assessment_area(engine, selected_bank, selected_year):
-    query = f"SELECT MD_Code, MSA_Code, State_Code, County_Code FROM Retail_Table WHERE id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') AND ActivityYear = {selected_year};"
-    df = pl.read_database(query, engine)
-    #print(f"Initial query result: {df}")
-
-    assessment_areas = {}
+    # One engine per process, however many times a rerun asks for it. The app only reads,
+    # so the file is opened read-only; each thread checks a connection out per query and
+    # returns it when done.
+    engine = create_engine(
+        'sqlite:///file:my_database.db?mode=ro&uri=true',
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=0,
+        connect_args={'check_same_thread': False},
+    )
+    atexit.register(engine.dispose)
+    return engine
+
+def database_path(engine):
+    # The file behind the engine, without the file: prefix of a URI
+    return engine.url.database.removeprefix('file:')
+
+@lru_cache(maxsize=None)
+def table_names(engine, db_fingerprint):
+    # Read once per engine and database version, so a reload that adds tables is noticed
+    return frozenset(inspect(engine).get_table_names())
+
+def has_table(engine, name):
+    return name in table_names(engine, Query_Cache.fingerprint(database_path(engine)))
+
+@lru_cache(maxsize=1024)
+def lookup_bank_ids(engine, selected_bank, db_fingerprint):
+    # Every id_rssd carrying this name, not just the first, looked up once per name and
+    # database version, so a reload that renames or adds banks is picked up
+    with engine.connect() as connection:
+        rows = connection.execute(text("SELECT id_rssd FROM bank WHERE bank_name = :bank_name;"), {'bank_name': selected_bank}).fetchall()
+    return tuple(row[0] for row in rows)
 
-    for row in df.iter_rows():
-        md_code, msa_code, state_code, county_code = row
-        lookup_method = None  # Reset lookup_method at the start of each loop iteration
-        #print(f"Lookup method reset to: {lookup_method}")
-        skip_row = False  # Reset skip_row at the start of each loop iteration
+def resolve_bank_ids(engine, selected_bank):
+    return lookup_bank_ids(engine, selected_bank, Query_Cache.fingerprint(database_path(engine)))
 
-        # Look up by MD_Code first
-        if md_code is not None and md_code != 'NA':
-                #print(f"MD_Code: {md_code}")
-                for table in ['2024 tracts', '2022-2023 tracts']:
-                    query = f"SELECT `MSA/MD name` FROM `{table}` WHERE `MSA/MD Code` = '{md_code}';"
-                    df = pl.read_database(query, engine)
-                    if df.height != 0:
-                        area_name = df['MSA/MD name'][0]
-                        lookup_method = 'md'
-                        assessment_areas[area_name] = {'codes': (md_code, msa_code, state_code, county_code, 'md')}
-                        #print(f"Used MD_Code {md_code} to look up MSA/MD name {area_name}. Lookup method: {lookup_method}")
-                        skip_row = True  # Set skip_row to True if MD_Code lookup was successful
-                        break
+def bank_params(engine, selected_bank, selected_year):
+    return {'bank_ids': list(resolve_bank_ids(engine, selected_bank)), 'selected_year': int(selected_year)}
 
-        # If MD_Code lookup was successful, skip the rest of the current row
-        if skip_row:
-            #print(f"Skipping row due to successful MD_Code lookup. Current lookup method: {lookup_method}")
-            continue
+def bank_statement(query):
+    # The id list is expanded into IN (?, ?, ...) when the statement runs
+    return text(query).bindparams(bindparam('bank_ids', expanding=True))
 
-        # If MD_Code lookup failed, try MSA_Code
-        if msa_code is not None and msa_code != 'NA':
-                #print(f"MSA_Code: {msa_code}")
-                for table in ['2024 tracts', '2022-2023 tracts']:
-                    query = f"SELECT `MSA/MD name` FROM `{table}` WHERE `MSA/MD Code` = '{msa_code}';"
-                    df = pl.read_database(query, engine)
-                    if df.height != 0:
-                        area_name = df['MSA/MD name'][0]
-                        lookup_method = 'msa' 
-                        assessment_areas[area_name] = {'codes': (md_code, msa_code, state_code, county_code, 'msa')}
-                        #print(f"Used MSA_Code {msa_code} to look up MSA/MD name {area_name}. Lookup method: {lookup_method}")
-                        break
+def fetch_bank_names_for_year(engine, selected_year):
+    # Banks with rows in the year, from the catalog csv_to_db.py builds. A database without
+    # it gets the same list from one indexed join against Retail_Table.
+    if has_table(engine, 'bank_catalog'):
+        query = "SELECT DISTINCT b.bank_name FROM bank_catalog c JOIN bank b ON b.id_rssd = c.id_rssd WHERE c.ActivityYear = :selected_year ORDER BY b.bank_name;"
+    else:
+        query = "SELECT DISTINCT bank_name FROM bank WHERE id_rssd IN (SELECT id_rssd FROM Retail_Table WHERE ActivityYear = :selected_year) ORDER BY bank_name;"
+    df = run_query(engine, text(query), {'selected_year': int(selected_year)})
+    return df['bank_name'].to_list()
 
-        #print(f"After MSA_Code lookup, current lookup method: {lookup_method}")
+def fetch_assessment_area(engine, selected_bank, selected_year):
+    # Every distinct geography the bank lent in, named in a single join against the geography
+    # tables built by csv_to_db.py and kept in the order the rows first appear
+    query = f"""
+        SELECT
+            r.MD_Code, r.MSA_Code, r.State_Code, r.County_Code,
+            md.area_name AS md_name, msa.area_name AS msa_name, county.area_name AS county_name
+        FROM (
+            SELECT MD_Code, MSA_Code, State_Code, County_Code, MIN(rowid) AS first_row
+            FROM Retail_Table
+            WHERE {bank_predicate}
+            GROUP BY MD_Code, MSA_Code, State_Code, County_Code
+        ) r
+        LEFT JOIN geo_area md ON md.area_code = r.MD_Code
+        LEFT JOIN geo_area msa ON msa.area_code = r.MSA_Code
+        LEFT JOIN geo_county county
+            ON r.State_Code NOT GLOB '*[^0-9]*' AND r.County_Code NOT GLOB '*[^0-9]*'
+            AND county.state_code = CAST(r.State_Code AS INTEGER) AND county.county_code = CAST(r.County_Code AS INTEGER)
+        ORDER BY r.first_row;
+    """
+    df = run_query(engine, bank_statement(query), bank_params(engine, selected_bank, selected_year))
+    return name_assessment_areas(df)
 
-        # If both MD_Code and MSA_Code lookups failed, try State_Code and County_Code
-        if lookup_method != 'md' and lookup_method != 'msa' and str(state_code).isdigit() and str(county_code).isdigit():
-            state_code, county_code = map(int, (state_code, county_code))
-            #print(f"Looking up by State_Code: {state_code} and County_Code: {county_code}")
-            for table in ['2024 tracts', '2022-2023 tracts']:
-                query = f"SELECT `County name`, `State` FROM `{table}` WHERE `State code` = {state_code} AND `County code` = {county_code};"
-                df = pl.read_database(query, engine)
-                if df.height != 0:
-                    area_name = f"{df['County name'][0]}, {df['State'][0]}"
-                    lookup_method = 'state_county' 
-                    assessment_areas[area_name] = {'codes': (md_code, msa_code, state_code, county_code, 'state_county')}
-                    #print(f"Used State_Code {state_code} and County_Code {county_code} to look up MSA/MD name {area_name}. Lookup method: {lookup_method}")
+def name_assessment_areas(df):
+    # Each row is named by its MD if it has one, otherwise its MSA, otherwise its county
+    assessment_areas = {}
 
-        #print(f"After State_Code and County_Code lookup, current lookup method: {lookup_method}")
+    for md_code, msa_code, state_code, county_code, md_name, msa_name, county_name in df.iter_rows():
+        if md_name is not None:
+            assessment_areas[md_name] = {'codes': (md_code, msa_code, state_code, county_code, 'md')}
+        elif msa_name is not None:
+            assessment_areas[msa_name] = {'codes': (md_code, msa_code, state_code, county_code, 'msa')}
+        elif county_name is not None:
+            assessment_areas[county_name] = {'codes': (md_code, msa_code, int(state_code), int(county_code), 'state_county')}
 
     if not assessment_areas:
         print("No matching records found")
         return None
 
-    #print(f"Assessment areas: {assessment_areas}")
     return assessment_areas
 
-def fetch_loan_data_loan_dist(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code):
-
-    # Print the values of the variables
-    #print(f"Engine: {engine}")
-    #print(f"Selected bank: {selected_bank}")
-    #print(f"Selected year: {selected_year}")
-    print(f"MD Code: {md_code}")
-    print(f"MSA Code: {msa_code}")
-    #print(f"Selected area: {selected_area}")
-    print(f"State Code: {state_code}")
-    print(f"County Code: {county_code}")
-    print(f"Lookup method: {lookup_method}")
-
-    # Query the loan data for the selected bank, year, and assessment area from the Retail_Table
-    if lookup_method == 'md':
-        #print("Using MD Code for lookup")
-        query = f"""
-        SELECT 
-            Amt_Orig_SFam_Closed, 
-            Amt_Orig_SFam_Open, 
-            Amt_Orig_MFam, 
-            SF_Amt_Orig, 
-            SB_Amt_Orig, 
-            Amt_Orig,
-            Partial_Ind,
-            State_Code,
-            County_Code 
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND MD_Code = '{md_code}';
-        """
-    elif lookup_method == 'msa':
-        #print("Using MSA Code for lookup")
-        query = f"""
-        SELECT 
-            Amt_Orig_SFam_Closed, 
-            Amt_Orig_SFam_Open, 
-            Amt_Orig_MFam, 
-            SF_Amt_Orig, 
-            SB_Amt_Orig, 
-            Amt_Orig,
-            Partial_Ind,
-            State_Code,
-            County_Code 
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND MSA_Code = '{msa_code}';
-        """
-    else:  # lookup_method == 'state_county'
-        #print("Using State and County Code for lookup")
-        query = f"""
-        SELECT 
-            Amt_Orig_SFam_Closed, 
-            Amt_Orig_SFam_Open, 
-            Amt_Orig_MFam, 
-            SF_Amt_Orig, 
-            SB_Amt_Orig, 
-            Amt_Orig,
-            Partial_Ind,
-            State_Code,
-            County_Code 
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND State_Code = {state_code} AND County_Code = {county_code};
-        """
-    df = pl.read_database(query, engine)
-
-    # Print the first few rows of the DataFrame
-    print(df.head())
-
-    return df
-
-def fetch_loan_data_inside_out(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code):
-
-    # Query the loan data for the selected bank, year, and assessment area from the Retail_Table
-    if lookup_method == 'md':
-        #print("Using MD Code for lookup")
-        query = f"""
-        SELECT 
-            Loan_Orig_SFam_Closed_Inside, 
-            Loan_Orig_SFam_Open_Inside, 
-            Loan_Orig_MFam_Inside, 
-            SB_Loan_Orig_Inside, 
-            SF_Loan_Orig_Inside, 
-            Amt_Orig_SFam_Closed_Inside,
-            Amt_Orig_SFam_Open_Inside,
-            Amt_Orig_MFam_Inside,
-            SB_Amt_Orig_Inside,
-            SF_Amt_Orig_Inside,
-            Loan_Orig_SFam_Closed,
-            Loan_Orig_SFam_Open,
-            Loan_Orig_MFam,
-            SB_Loan_Orig,
-            SF_Loan_Orig,
-            Amt_Orig_SFam_Closed,
-            Amt_Orig_SFam_Open,
-            Amt_Orig_MFam,
-            Amt_Orig,
-            SB_Amt_Orig,
-            SF_Amt_Orig,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND MD_Code = '{md_code}';
-        """
-    elif lookup_method == 'msa':
-        #print("Using MSA Code for lookup")
-        query = f"""
-        SELECT 
-            Loan_Orig_SFam_Closed_Inside, 
-            Loan_Orig_SFam_Open_Inside, 
-            Loan_Orig_MFam_Inside, 
-            SB_Loan_Orig_Inside, 
-            SF_Loan_Orig_Inside, 
-            Amt_Orig_SFam_Closed_Inside,
-            Amt_Orig_SFam_Open_Inside,
-            Amt_Orig_MFam_Inside,
-            SB_Amt_Orig_Inside,
-            SF_Amt_Orig_Inside,
-            Loan_Orig_SFam_Closed,
-            Loan_Orig_SFam_Open,
-            Loan_Orig_MFam,
-            SB_Loan_Orig,
-            SF_Loan_Orig,
-            Amt_Orig_SFam_Closed,
-            Amt_Orig_SFam_Open,
-            Amt_Orig_MFam,
-            Amt_Orig,
-            SB_Amt_Orig,
-            SF_Amt_Orig,
-            State_Code,
-            County_Code 
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND MSA_Code = '{msa_code}';
-        """
-    else:  # lookup_method == 'state_county'
-        #print("Using State and County Code for lookup")
-        query = f"""
-        SELECT 
-            Loan_Orig_SFam_Closed_Inside, 
-            Loan_Orig_SFam_Open_Inside, 
-            Loan_Orig_MFam_Inside, 
-            SB_Loan_Orig_Inside, 
-            SF_Loan_Orig_Inside, 
-            Amt_Orig_SFam_Closed_Inside,
-            Amt_Orig_SFam_Open_Inside,
-            Amt_Orig_MFam_Inside,
-            SB_Amt_Orig_Inside,
-            SF_Amt_Orig_Inside,
-            Loan_Orig_SFam_Closed,
-            Loan_Orig_SFam_Open,
-            Loan_Orig_MFam,
-            SB_Loan_Orig,
-            SF_Loan_Orig,
-            Amt_Orig_SFam_Closed,
-            Amt_Orig_SFam_Open,
-            Amt_Orig_MFam,
-            Amt_Orig,
-            SB_Amt_Orig,
-            SF_Amt_Orig,
-            State_Code,
-            County_Code 
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND State_Code = {state_code} AND County_Code = {county_code};
-        """
-    # Create a Polars DataFrame
-    with engine.connect() as connection:
-        result = connection.execute(text(query))
-        rows = result.fetchall()
-        columns = result.keys()
-
-    # Create a list of dictionaries for constructing the DataFrame
-    data_dicts = [dict(zip(columns, row)) for row in rows]
-
-    # Debug: Print data_dicts
-    #print(f"Data Dicts: {data_dicts}")
-
-    # Create the Polars DataFrame
-    df = pl.DataFrame(data_dicts)
-
-    # Print the first few rows of the DataFrame
-    #print(df.head())
-
-    return df
-
-def fetch_loan_data_bor_income(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code):
-
-    # Query the loan data for the selected bank, year, and assessment area from the Retail_Table
-    if lookup_method == 'md':
-        #print("Using MD Code for lookup")
-        query = f"""
-        SELECT 
-            Loan_Orig_SFam_Closed_BILow,
-            Loan_Orig_SFam_Closed_BIMod,
-            Loan_Orig_SFam_Closed,
-            Loan_Orig_SFam_Open_BILow,
-            Loan_Orig_SFam_Open_BIMod,
-            Loan_Orig_SFam_Open,
-            Loan_Orig_BILow,
-            Loan_Orig_BIMod,
-            Loan_Orig,
-            Agg_Loan_Orig_SFam_Closed_BILow,
-            Agg_Loan_Orig_SFam_Closed_BIMod,
-            Agg_Loan_Orig_SFam_Closed,
-            Agg_Loan_Orig_SFam_Open_BILow,
-            Agg_Loan_Orig_SFam_Open_BIMod,
-            Agg_Loan_Orig_SFam_Open,
-            Agg_Loan_Orig_BILow,
-            Agg_Loan_Orig_BIMod,
-            Agg_Loan_Orig,
-            Amt_Orig_SFam_Closed_BILow,
-            Amt_Orig_SFam_Closed_BIMod,
-            Amt_Orig_SFam_Closed,
-            Amt_Orig_SFam_Open_BILow,
-            Amt_Orig_SFam_Open_BIMod,
-            Amt_Orig_SFam_Open,
-            Amt_Orig_BILow,
-            Amt_Orig_BIMod,
-            Amt_Orig,
-            Agg_Amt_Orig_SFam_Closed_BILow,
-            Agg_Amt_Orig_SFam_Closed_BIMod,
-            Agg_Amt_Orig_SFam_Closed,
-            Agg_Amt_Orig_SFam_Open_BILow,
-            Agg_Amt_Orig_SFam_Open_BIMod,
-            Agg_Amt_Orig_SFam_Open,
-            Agg_Amt_Orig_BIMod,
-            Agg_Amt_Orig_BILow,
-            Agg_Amt_Orig,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND MD_Code = '{md_code}';
-        """
-    elif lookup_method == 'msa':
-        #print("Using MSA Code for lookup")
-        query = f"""
-        SELECT 
-            Loan_Orig_SFam_Closed_BILow,
-            Loan_Orig_SFam_Closed_BIMod,
-            Loan_Orig_SFam_Closed,
-            Loan_Orig_SFam_Open_BILow,
-            Loan_Orig_SFam_Open_BIMod,
-            Loan_Orig_SFam_Open,
-            Loan_Orig_BILow,
-            Loan_Orig_BIMod,
-            Loan_Orig,
-            Agg_Loan_Orig_SFam_Closed_BILow,
-            Agg_Loan_Orig_SFam_Closed_BIMod,
-            Agg_Loan_Orig_SFam_Closed,
-            Agg_Loan_Orig_SFam_Open_BILow,
-            Agg_Loan_Orig_SFam_Open_BIMod,
-            Agg_Loan_Orig_SFam_Open,
-            Agg_Loan_Orig_BILow,
-            Agg_Loan_Orig_BIMod,
-            Agg_Loan_Orig,
-            Amt_Orig_SFam_Closed_BILow,
-            Amt_Orig_SFam_Closed_BIMod,
-            Amt_Orig_SFam_Closed,
-            Amt_Orig_SFam_Open_BILow,
-            Amt_Orig_SFam_Open_BIMod,
-            Amt_Orig_SFam_Open,
-            Amt_Orig_BILow,
-            Amt_Orig_BIMod,
-            Amt_Orig,
-            Agg_Amt_Orig_SFam_Closed_BILow,
-            Agg_Amt_Orig_SFam_Closed_BIMod,
-            Agg_Amt_Orig_SFam_Closed,
-            Agg_Amt_Orig_SFam_Open_BILow,
-            Agg_Amt_Orig_SFam_Open_BIMod,
-            Agg_Amt_Orig_SFam_Open,
-            Agg_Amt_Orig_BIMod,
-            Agg_Amt_Orig_BILow,
-            Agg_Amt_Orig,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND MSA_Code = '{msa_code}';
-        """
-    else:  # lookup_method == 'state_county'
-        #print("Using State and County Code for lookup")
-        query = f"""
-        SELECT 
-            Loan_Orig_SFam_Closed_BILow,
-            Loan_Orig_SFam_Closed_BIMod,
-            Loan_Orig_SFam_Closed,
-            Loan_Orig_SFam_Open_BILow,
-            Loan_Orig_SFam_Open_BIMod,
-            Loan_Orig_SFam_Open,
-            Loan_Orig_BILow,
-            Loan_Orig_BIMod,
-            Loan_Orig,
-            Agg_Loan_Orig_SFam_Closed_BILow,
-            Agg_Loan_Orig_SFam_Closed_BIMod,
-            Agg_Loan_Orig_SFam_Closed,
-            Agg_Loan_Orig_SFam_Open_BILow,
-            Agg_Loan_Orig_SFam_Open_BIMod,
-            Agg_Loan_Orig_SFam_Open,
-            Agg_Loan_Orig_BILow,
-            Agg_Loan_Orig_BIMod,
-            Agg_Loan_Orig,
-            Amt_Orig_SFam_Closed_BILow,
-            Amt_Orig_SFam_Closed_BIMod,
-            Amt_Orig_SFam_Closed,
-            Amt_Orig_SFam_Open_BILow,
-            Amt_Orig_SFam_Open_BIMod,
-            Amt_Orig_SFam_Open,
-            Amt_Orig_BILow,
-            Amt_Orig_BIMod,
-            Amt_Orig,
-            Agg_Amt_Orig_SFam_Closed_BILow,
-            Agg_Amt_Orig_SFam_Closed_BIMod,
-            Agg_Amt_Orig_SFam_Closed,
-            Agg_Amt_Orig_SFam_Open_BILow,
-            Agg_Amt_Orig_SFam_Open_BIMod,
-            Agg_Amt_Orig_SFam_Open,
-            Agg_Amt_Orig_BIMod,
-            Agg_Amt_Orig_BILow,
-            Agg_Amt_Orig,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND State_Code = {state_code} AND County_Code = {county_code};
-        """
-    # Create a Polars DataFrame
-    with engine.connect() as connection:
-        result = connection.execute(text(query))
-        rows = result.fetchall()
-        columns = result.keys()
-
-    # Create a list of dictionaries for constructing the DataFrame
-    data_dicts = [dict(zip(columns, row)) for row in rows]
-
-    # Debug: Print data_dicts
-    #print(f"Data Dicts: {data_dicts}")
-
-    # Create the Polars DataFrame
-    df = pl.DataFrame(data_dicts)
-
-    # Print the first few rows of the DataFrame
-    print(df.head())
-
-    return df
-
-def fetch_loan_data_tract_income(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code):
-
-    # Query the loan data for the selected bank, year, and assessment area from the Retail_Table
+def summed_query(query, columns):
+    # One row of column totals, as the renderers' df.sum() would give. Text columns are
+    # not summed and come back empty; with no matching rows the totals are 0.
+    columns = ', '.join(
+        f'NULL AS {col}' if col in text_columns else f'COALESCE(SUM({col}), 0) AS {col}'
+        for col in columns
+    )
+    return f"SELECT {columns} FROM ({query.strip().rstrip(';')});"
+
+def area_key(lookup_method, md_code, msa_code, state_code, county_code):
+    # How an assessment area is keyed in the agg_<report> tables
     if lookup_method == 'md':
-        #print("Using MD Code for lookup")
-        query = f"""
-        SELECT 
-            Loan_Orig_SFam_Closed,
-			Loan_Orig_SFam_Open,
-			Loan_Orig,
-			Agg_Loan_Orig_SFam_Closed,
-			Agg_Loan_Orig_SFam_Open,
-			Agg_Loan_Orig,
-			Amt_Orig_SFam_Closed,
-			Amt_Orig_SFam_Open,
-			Amt_Orig,
-			Agg_Amt_Orig_SFam_Closed,
-			Agg_Amt_Orig_SFam_Open,
-			Agg_Amt_Orig,
-			Loan_Orig_SFam_Closed_TILow,
-			Loan_Orig_SFam_Closed_TIMod,
-			Loan_Orig_SFam_Open_TILow,
-			Loan_Orig_SFam_Open_TIMod,
-			Loan_Orig_MFam_TILow,
-			Loan_Orig_MFam_TIMod,
-			Loan_Orig_MFam,
-			Loan_Orig_TILow,
-			Loan_Orig_TIMod,
-			Agg_Loan_Orig_SFam_Closed_TILow,
-			Agg_Loan_Orig_SFam_Closed_TIMod,
-			Agg_Loan_Orig_SFam_Open_TILow,
-			Agg_Loan_Orig_SFam_Open_TIMod,
-			Agg_Loan_Orig_MFam_TILow,
-			Agg_Loan_Orig_MFam_TIMod,
-			Agg_Loan_Orig_MFam,
-			Agg_Loan_Orig_TILow,
-			Agg_Loan_Orig_TIMod,
-			Amt_Orig_SFam_Closed_TILow,
-			Amt_Orig_SFam_Closed_TIMod,
-			Amt_Orig_SFam_Open_TILow,
-			Amt_Orig_SFam_Open_TIMod,
-			Amt_Orig_MFam_TILow,
-			Amt_Orig_MFam_TIMod,
-			Amt_Orig_MFam,
-			Amt_Orig_TILow,
-			Amt_Orig_TIMod,
-			Agg_Amt_Orig_SFam_Closed_TILow,
-			Agg_Amt_Orig_SFam_Closed_TIMod,
-			Agg_Amt_Orig_SFam_Open_TILow,
-			Agg_Amt_Orig_SFam_Open_TIMod,
-			Agg_Amt_Orig_MFam_TILow,
-			Agg_Amt_Orig_MFam_TIMod,
-			Agg_Amt_Orig_MFam,
-			Agg_Amt_Orig_TILow,
-			Agg_Amt_Orig_TIMod,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND MD_Code = '{md_code}';
-        """
+        return str(md_code)
     elif lookup_method == 'msa':
-        #print("Using MSA Code for lookup")
-        query = f"""
-        SELECT 
-            Loan_Orig_SFam_Closed,
-			Loan_Orig_SFam_Open,
-			Loan_Orig,
-			Agg_Loan_Orig_SFam_Closed,
-			Agg_Loan_Orig_SFam_Open,
-			Agg_Loan_Orig,
-			Amt_Orig_SFam_Closed,
-			Amt_Orig_SFam_Open,
-			Amt_Orig,
-			Agg_Amt_Orig_SFam_Closed,
-			Agg_Amt_Orig_SFam_Open,
-			Agg_Amt_Orig,
-			Loan_Orig_SFam_Closed_TILow,
-			Loan_Orig_SFam_Closed_TIMod,
-			Loan_Orig_SFam_Open_TILow,
-			Loan_Orig_SFam_Open_TIMod,
-			Loan_Orig_MFam_TILow,
-			Loan_Orig_MFam_TIMod,
-			Loan_Orig_MFam,
-			Loan_Orig_TILow,
-			Loan_Orig_TIMod,
-			Agg_Loan_Orig_SFam_Closed_TILow,
-			Agg_Loan_Orig_SFam_Closed_TIMod,
-			Agg_Loan_Orig_SFam_Open_TILow,
-			Agg_Loan_Orig_SFam_Open_TIMod,
-			Agg_Loan_Orig_MFam_TILow,
-			Agg_Loan_Orig_MFam_TIMod,
-			Agg_Loan_Orig_MFam,
-			Agg_Loan_Orig_TILow,
-			Agg_Loan_Orig_TIMod,
-			Amt_Orig_SFam_Closed_TILow,
-			Amt_Orig_SFam_Closed_TIMod,
-			Amt_Orig_SFam_Open_TILow,
-			Amt_Orig_SFam_Open_TIMod,
-			Amt_Orig_MFam_TILow,
-			Amt_Orig_MFam_TIMod,
-			Amt_Orig_MFam,
-			Amt_Orig_TILow,
-			Amt_Orig_TIMod,
-			Agg_Amt_Orig_SFam_Closed_TILow,
-			Agg_Amt_Orig_SFam_Closed_TIMod,
-			Agg_Amt_Orig_SFam_Open_TILow,
-			Agg_Amt_Orig_SFam_Open_TIMod,
-			Agg_Amt_Orig_MFam_TILow,
-			Agg_Amt_Orig_MFam_TIMod,
-			Agg_Amt_Orig_MFam,
-			Agg_Amt_Orig_TILow,
-			Agg_Amt_Orig_TIMod,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND MSA_Code = '{msa_code}';
-        """
+        return str(msa_code)
     else:  # lookup_method == 'state_county'
-        #print("Using State and County Code for lookup")
-        query = f"""
-        SELECT 
-            Loan_Orig_SFam_Closed,
-			Loan_Orig_SFam_Open,
-			Loan_Orig,
-			Agg_Loan_Orig_SFam_Closed,
-			Agg_Loan_Orig_SFam_Open,
-			Agg_Loan_Orig,
-			Amt_Orig_SFam_Closed,
-			Amt_Orig_SFam_Open,
-			Amt_Orig,
-			Agg_Amt_Orig_SFam_Closed,
-			Agg_Amt_Orig_SFam_Open,
-			Agg_Amt_Orig,
-			Loan_Orig_SFam_Closed_TILow,
-			Loan_Orig_SFam_Closed_TIMod,
-			Loan_Orig_SFam_Open_TILow,
-			Loan_Orig_SFam_Open_TIMod,
-			Loan_Orig_MFam_TILow,
-			Loan_Orig_MFam_TIMod,
-			Loan_Orig_MFam,
-			Loan_Orig_TILow,
-			Loan_Orig_TIMod,
-			Agg_Loan_Orig_SFam_Closed_TILow,
-			Agg_Loan_Orig_SFam_Closed_TIMod,
-			Agg_Loan_Orig_SFam_Open_TILow,
-			Agg_Loan_Orig_SFam_Open_TIMod,
-			Agg_Loan_Orig_MFam_TILow,
-			Agg_Loan_Orig_MFam_TIMod,
-			Agg_Loan_Orig_MFam,
-			Agg_Loan_Orig_TILow,
-			Agg_Loan_Orig_TIMod,
-			Amt_Orig_SFam_Closed_TILow,
-			Amt_Orig_SFam_Closed_TIMod,
-			Amt_Orig_SFam_Open_TILow,
-			Amt_Orig_SFam_Open_TIMod,
-			Amt_Orig_MFam_TILow,
-			Amt_Orig_MFam_TIMod,
-			Amt_Orig_MFam,
-			Amt_Orig_TILow,
-			Amt_Orig_TIMod,
-			Agg_Amt_Orig_SFam_Closed_TILow,
-			Agg_Amt_Orig_SFam_Closed_TIMod,
-			Agg_Amt_Orig_SFam_Open_TILow,
-			Agg_Amt_Orig_SFam_Open_TIMod,
-			Agg_Amt_Orig_MFam_TILow,
-			Agg_Amt_Orig_MFam_TIMod,
-			Agg_Amt_Orig_MFam,
-			Agg_Amt_Orig_TILow,
-			Agg_Amt_Orig_TIMod,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND State_Code = {state_code} AND County_Code = {county_code};
-        """
-    # Create a Polars DataFrame
-    with engine.connect() as connection:
-        result = connection.execute(text(query))
-        rows = result.fetchall()
-        columns = result.keys()
-
-    # Create a list of dictionaries for constructing the DataFrame
-    data_dicts = [dict(zip(columns, row)) for row in rows]
-
-    # Debug: Print data_dicts
-    #print(f"Data Dicts: {data_dicts}")
+        return f"{int(state_code)},{int(county_code)}"
 
-    # Create the Polars DataFrame
-    df = pl.DataFrame(data_dicts)
-
-    # Print the first few rows of the DataFrame
-    print(df.head())
-
-    return df
-
-def fetch_loan_data_business(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code):
-
-    # Query the loan data for the selected bank, year, and assessment area from the Retail_Table
+def area_params(lookup_method, md_code, msa_code, state_code, county_code):
+    # Values bound to the area predicate of the lookup method
     if lookup_method == 'md':
-        #print("Using MD Code for lookup")
-        query = f"""
-        SELECT 
-            SB_Loan_Orig_TILow,
-			SB_Loan_Orig_TIMod,
-			SB_Loan_Orig,
-			Agg_SB_Loan_Purch_TILow,
-			Agg_SB_Loan_Orig_TIMod,
-			Agg_SB_Loan_Orig,
-			SF_Loan_Orig_TILow,
-			SF_Loan_Orig_TIMod,
-			SF_Loan_Orig,
-			Agg_SF_Loan_Orig_TILow,
-			Agg_SF_Loan_Orig_TIMod,
-			Agg_SF_Loan_Orig,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND MD_Code = '{md_code}';
-        """
+        return {'md_code': str(md_code)}
     elif lookup_method == 'msa':
-        #print("Using MSA Code for lookup")
-        query = f"""
-        SELECT 
-            SB_Loan_Orig_TILow,
-			SB_Loan_Orig_TIMod,
-			SB_Loan_Orig,
-			Agg_SB_Loan_Purch_TILow,
-			Agg_SB_Loan_Orig_TIMod,
-			Agg_SB_Loan_Orig,
-			SF_Loan_Orig_TILow,
-			SF_Loan_Orig_TIMod,
-			SF_Loan_Orig,
-			Agg_SF_Loan_Orig_TILow,
-			Agg_SF_Loan_Orig_TIMod,
-			Agg_SF_Loan_Orig,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND MSA_Code = '{msa_code}';
-        """
+        return {'msa_code': str(msa_code)}
     else:  # lookup_method == 'state_county'
-        #print("Using State and County Code for lookup")
-        query = f"""
-        SELECT 
-            SB_Loan_Orig_TILow,
-			SB_Loan_Orig_TIMod,
-			SB_Loan_Orig,
-			Agg_SB_Loan_Purch_TILow,
-			Agg_SB_Loan_Orig_TIMod,
-			Agg_SB_Loan_Orig,
-			SF_Loan_Orig_TILow,
-			SF_Loan_Orig_TIMod,
-			SF_Loan_Orig,
-			Agg_SF_Loan_Orig_TILow,
-			Agg_SF_Loan_Orig_TIMod,
-			Agg_SF_Loan_Orig,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND State_Code = {state_code} AND County_Code = {county_code};
-        """
-    # Create a Polars DataFrame
-    with engine.connect() as connection:
-        result = connection.execute(text(query))
-        rows = result.fetchall()
-        columns = result.keys()
-
-    # Create a list of dictionaries for constructing the DataFrame
-    data_dicts = [dict(zip(columns, row)) for row in rows]
-
-    # Create the Polars DataFrame
-    df = pl.DataFrame(data_dicts)
-
-    # Print the first few rows of the DataFrame
-    print(df.head())
-
+        return {'state_code': int(state_code), 'county_code': int(county_code)}
+
+def arrow_uri(engine):
+    # The SQLite file behind the engine, opened in the same mode
+    mode = engine.url.query.get('mode')
+    return f"{engine.url.database}?mode={mode}" if mode else engine.url.database
+
+def run_arrow_query(engine, statement, params):
+    # Render the statement for these values (expanding the id list) and bind them by position
+    compiled = statement.bindparams(**params).compile(dialect=engine.dialect, compile_kwargs={'render_postcompile': True})
+    parameters = [compiled.params[name] for name in compiled.positiontup]
+
+    # Like the engine's pool: at most pool_size connections per database file, each handed
+    # to one thread at a time, and a query waits for a free one when all are in use
+    slots, idle = arrow_pools.setdefault(arrow_uri(engine), (threading.BoundedSemaphore(pool_size), SimpleQueue()))
+    with slots:
+        try:
+            conn = idle.get_nowait()
+        except Empty:
+            conn = adbc_sqlite.connect(arrow_uri(engine), autocommit=True)
+            arrow_connections.append(conn)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(str(compiled), parameters)
+                table = cursor.fetch_arrow_table()
+        finally:
+            idle.put(conn)
+    return pl.from_arrow(table)
+
+def close_arrow_connections():
+    for conn in arrow_connections:
+        conn.close()
+
+atexit.register(close_arrow_connections)
+
+def run_query(engine, statement, params):
+    # Repeat queries are answered from Query_Cache, keyed on the SQL, its values and the
+    # database file's fingerprint, without touching SQLite
+    key = Query_Cache.cache_key(str(statement), params, Query_Cache.fingerprint(database_path(engine)))
+    df = Query_Cache.get(key)
+    if df is None:
+        df = read_query(engine, statement, params)
+        Query_Cache.put(key, df)
     return df
 
-def fetch_loan_business_size(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code):
-
-    # Query the loan data for the selected bank, year, and assessment area from the Retail_Table
-    if lookup_method == 'md':
-        #print("Using MD Code for lookup")
-        query = f"""
-        SELECT 
-            SB_Loan_Orig_GAR_less_1m,
-			SB_Loan_Orig,
-			SF_Loan_Orig_GAR_less_1m,
-			SF_Loan_Orig,
-			Agg_SB_Loan_Orig_GAR_less_1m,
-			Agg_SB_Loan_Orig,
-			Agg_SF_Loan_Orig_GAR_less_1m,
-			Agg_SF_Loan_Orig,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND MD_Code = '{md_code}';
-        """
-    elif lookup_method == 'msa':
-        #print("Using MSA Code for lookup")
-        query = f"""
-        SELECT 
-            SB_Loan_Orig_GAR_less_1m,
-			SB_Loan_Orig,
-			SF_Loan_Orig_GAR_less_1m,
-			SF_Loan_Orig,
-			Agg_SB_Loan_Orig_GAR_less_1m,
-			Agg_SB_Loan_Orig,
-			Agg_SF_Loan_Orig_GAR_less_1m,
-			Agg_SF_Loan_Orig,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND MSA_Code = '{msa_code}';
-        """
-    else:  # lookup_method == 'state_county'
-        #print("Using State and County Code for lookup")
-        query = f"""
-        SELECT 
-            SB_Loan_Orig_GAR_less_1m,
-			SB_Loan_Orig,
-			SF_Loan_Orig_GAR_less_1m,
-			SF_Loan_Orig,
-			Agg_SB_Loan_Orig_GAR_less_1m,
-			Agg_SB_Loan_Orig,
-			Agg_SF_Loan_Orig_GAR_less_1m,
-			Agg_SF_Loan_Orig,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND State_Code = {state_code} AND County_Code = {county_code};
-        """
-    # Create a Polars DataFrame
-    with engine.connect() as connection:
-        result = connection.execute(text(query))
-        rows = result.fetchall()
-        columns = result.keys()
-
-    # Create a list of dictionaries for constructing the DataFrame
-    data_dicts = [dict(zip(columns, row)) for row in rows]
-
-    # Create the Polars DataFrame
-    df = pl.DataFrame(data_dicts)
-
-    # Print the first few rows of the DataFrame
-    print(df.head())
+def read_query(engine, statement, params):
+    df = read_rows(engine, statement, params)
 
-    return df
+    # A text column holding only NULLs (as in a row of totals) has no type to go by
+    return df.with_columns(pl.col(col).cast(pl.Utf8) for col in text_columns if col in df.columns)
 
-def fetch_demographics(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code):
+def read_rows(engine, statement, params):
+    # With adbc_driver_sqlite, rows go from SQLite straight into typed Arrow columns. A query
+    # it can't type (a column changing storage class part way) takes the row path below.
+    if adbc_sqlite is not None:
+        try:
+            return run_arrow_query(engine, statement, params)
+        except adbc_sqlite.Error:
+            pass
 
-    # Query the loan data for the selected bank, year, and assessment area from the Retail_Table
-    if lookup_method == 'md':
-        #print("Using MD Code for lookup")
-        query = f"""
-        SELECT 
-            Owner_Occupied_Units_TILow_Inside,
-			Owner_Occupied_Units_TIMod_Inside,
-			Owner_Occupied_Units_Inside,
-			Total5orMoreHousingUnitsInStructure_TILow_Inside,
-			Total5orMoreHousingUnitsInStructure_TIMod_Inside,
-			Total5orMoreHousingUnitsInStructure_Inside,
-			Low_Income_Family_Count_Inside,
-			Moderate_Income_Family_Count_Inside,
-			Family_Count_Inside,
-			Owner_Occupied_Units_TILow,
-			Owner_Occupied_Units_TIMod,
-			Owner_Occupied_Units,
-			Total5orMoreHousingUnitsInStructure_TILow,
-			Total5orMoreHousingUnitsInStructure_TIMod,
-			Total5orMoreHousingUnitsInStructure,
-			Low_Income_Family_Count,
-			Moderate_Income_Family_Count,
-			Family_Count,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND MD_Code = '{md_code}';
-        """
-    elif lookup_method == 'msa':
-        #print("Using MSA Code for lookup")
-        query = f"""
-        SELECT 
-            Owner_Occupied_Units_TILow_Inside,
-			Owner_Occupied_Units_TIMod_Inside,
-			Owner_Occupied_Units_Inside,
-			Total5orMoreHousingUnitsInStructure_TILow_Inside,
-			Total5orMoreHousingUnitsInStructure_TIMod_Inside,
-			Total5orMoreHousingUnitsInStructure_Inside,
-			Low_Income_Family_Count_Inside,
-			Moderate_Income_Family_Count_Inside,
-			Family_Count_Inside,
-			Owner_Occupied_Units_TILow,
-			Owner_Occupied_Units_TIMod,
-			Owner_Occupied_Units,
-			Total5orMoreHousingUnitsInStructure_TILow,
-			Total5orMoreHousingUnitsInStructure_TIMod,
-			Total5orMoreHousingUnitsInStructure,
-			Low_Income_Family_Count,
-			Moderate_Income_Family_Count,
-			Family_Count,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND MSA_Code = '{msa_code}';
-        """
-    else:  # lookup_method == 'state_county'
-        #print("Using State and County Code for lookup")
-        query = f"""
-        SELECT 
-            Owner_Occupied_Units_TILow_Inside,
-			Owner_Occupied_Units_TIMod_Inside,
-			Owner_Occupied_Units_Inside,
-			Total5orMoreHousingUnitsInStructure_TILow_Inside,
-			Total5orMoreHousingUnitsInStructure_TIMod_Inside,
-			Total5orMoreHousingUnitsInStructure_Inside,
-			Low_Income_Family_Count_Inside,
-			Moderate_Income_Family_Count_Inside,
-			Family_Count_Inside,
-			Owner_Occupied_Units_TILow,
-			Owner_Occupied_Units_TIMod,
-			Owner_Occupied_Units,
-			Total5orMoreHousingUnitsInStructure_TILow,
-			Total5orMoreHousingUnitsInStructure_TIMod,
-			Total5orMoreHousingUnitsInStructure,
-			Low_Income_Family_Count,
-			Moderate_Income_Family_Count,
-			Family_Count,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND State_Code = {state_code} AND County_Code = {county_code};
-        """
-    # Create a Polars DataFrame
+    # Values are always bound, so the SQL text of a statement never changes between calls
+    # and both SQLAlchemy's compiled cache and sqlite3's prepared statement cache are reused
     with engine.connect() as connection:
-        result = connection.execute(text(query))
+        result = connection.execute(statement, params)
+        columns = list(result.keys())
         rows = result.fetchall()
-        columns = result.keys()
+    return pl.DataFrame(rows, schema=columns, orient='row', infer_schema_length=None)
+
+def union_columns(reports):
+    # Every column the reports read, each once, in first-seen order
+    return list(dict.fromkeys(col for report in reports for col in report_columns[report]))
+
+@lru_cache(maxsize=None)
+def report_statement(reports, lookup_method, aggregate=False):
+    # One statement per set of reports, lookup method and mode, built the first time it is used
+    columns = union_columns(reports)
+    query = f"SELECT {', '.join(columns)} FROM Retail_Table WHERE {bank_predicate} AND {area_predicates[lookup_method]};"
+    if aggregate:
+        query = summed_query(query, columns)
+    return bank_statement(query)
+
+@lru_cache(maxsize=None)
+def area_sums_statement(report):
+    # A name can cover several id_rssd, each with its own pre-summed row, so the matching
+    # rows are summed again: always exactly one row, of zeros when nothing matches
+    query = f"SELECT * FROM agg_{report} WHERE {bank_predicate} AND lookup_method = :lookup_method AND area_key = :area_key;"
+    return bank_statement(summed_query(query, report_columns[report]))
+
+def fetch_area_sums(engine, report, selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code):
+    # None when the database predates the aggregate tables, so the caller sums the raw rows
+    if not has_table(engine, f'agg_{report}'):
+        return None
 
-    # Create a list of dictionaries for constructing the DataFrame
-    data_dicts = [dict(zip(columns, row)) for row in rows]
+    params = {
+        **bank_params(engine, selected_bank, selected_year),
+        'lookup_method': lookup_method,
+        'area_key': area_key(lookup_method, md_code, msa_code, state_code, county_code),
+    }
+    return run_query(engine, area_sums_statement(report), params)
 
-    # Debug: Print data_dicts
-    #print(f"Data Dicts: {data_dicts}")
+def fetch_reports(engine, reports, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    # Several reports for one area, as {report: frame}. Totals (aggregate=True) are a single-row
+    # lookup in the aggregate tables when they exist; rows, or totals without the tables, come
+    # from one query over the union of the reports' columns, split per report, so ticking more
+    # reports never adds a scan.
+    reports = tuple(report for report in report_columns if report in set(reports))
+    if not reports:
+        return {}
 
-    # Create the Polars DataFrame
-    df = pl.DataFrame(data_dicts)
+    if aggregate and all(has_table(engine, f'agg_{report}') for report in reports):
+        return {
+            report: fetch_area_sums(engine, report, selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code)
+            for report in reports
+        }
 
-    # Print the first few rows of the DataFrame
-    print(df.head())
+    params = {**bank_params(engine, selected_bank, selected_year), **area_params(lookup_method, md_code, msa_code, state_code, county_code)}
+    df = run_query(engine, report_statement(reports, lookup_method, aggregate), params)
+    return {report: df.select(report_columns[report]) for report in reports}
 
-    return df
+def fetch_report(engine, report, selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate=False):
+    return fetch_reports(engine, [report], selected_bank, selected_year, md_code, msa_code, None, lookup_method, state_code, county_code, aggregate)[report]
 
+def fetch_loan_data_loan_dist(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    return fetch_report(engine, 'loan_dist', selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate)
 
-def fetch_bus_demographics(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code):
+def fetch_loan_data_inside_out(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    return fetch_report(engine, 'inside_out', selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate)
 
-    # Query the loan data for the selected bank, year, and assessment area from the Retail_Table
-    if lookup_method == 'md':
-        #print("Using MD Code for lookup")
-        query = f"""
-        SELECT 
-            Establishments_Small_Business_TILow_Inside,
-			Establishments_Small_Business_TIMod_Inside,
-			Establishments_Small_Business_Inside,
-			Establishments_GAR_Less_1M_Small_Business_Inside,
-			Establishments_GAR_1_to_250k_Small_Business_Inside,
-			Establishments_GAR_250k_to_1M_Small_Business_Inside,
-			Establishments_Small_Farm_TILow_Inside,
-			Establishments_Small_Farm_TIMod_Inside,
-			Establishments_Small_Farm_Inside,
-			Establishments_GAR_Less_1M_Small_Farm_Inside,
-			Establishments_GAR_1_to_250k_Small_Farm_Inside,
-			Establishments_GAR_250k_to_1M_Small_Farm_Inside,
-			Establishments_Small_Business_TILow,
-			Establishments_Small_Business_TIMod,
-			Establishments_Small_Business,
-			Establishments_GAR_Less_1M_Small_Business,
-			Establishments_GAR_1_to_250k_Small_Business,
-			Establishments_GAR_250k_to_1M_Small_Business,
-			Establishments_Small_Farm_TILow,
-			Establishments_Small_Farm_TIMod,
-			Establishments_Small_Farm,
-			Establishments_GAR_Less_1M_Small_Farm,
-			Establishments_GAR_1_to_250k_Small_Farm,
-			Establishments_GAR_250k_to_1M_Small_Farm,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND MD_Code = '{md_code}';
-        """
-    elif lookup_method == 'msa':
-        #print("Using MSA Code for lookup")
-        query = f"""
-        SELECT 
-            Establishments_Small_Business_TILow_Inside,
-			Establishments_Small_Business_TIMod_Inside,
-			Establishments_Small_Business_Inside,
-			Establishments_GAR_Less_1M_Small_Business_Inside,
-			Establishments_GAR_1_to_250k_Small_Business_Inside,
-			Establishments_GAR_250k_to_1M_Small_Business_Inside,
-			Establishments_Small_Farm_TILow_Inside,
-			Establishments_Small_Farm_TIMod_Inside,
-			Establishments_Small_Farm_Inside,
-			Establishments_GAR_Less_1M_Small_Farm_Inside,
-			Establishments_GAR_1_to_250k_Small_Farm_Inside,
-			Establishments_GAR_250k_to_1M_Small_Farm_Inside,
-			Establishments_Small_Business_TILow,
-			Establishments_Small_Business_TIMod,
-			Establishments_Small_Business,
-			Establishments_GAR_Less_1M_Small_Business,
-			Establishments_GAR_1_to_250k_Small_Business,
-			Establishments_GAR_250k_to_1M_Small_Business,
-			Establishments_Small_Farm_TILow,
-			Establishments_Small_Farm_TIMod,
-			Establishments_Small_Farm,
-			Establishments_GAR_Less_1M_Small_Farm,
-			Establishments_GAR_1_to_250k_Small_Farm,
-			Establishments_GAR_250k_to_1M_Small_Farm,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND MSA_Code = '{msa_code}';
-        """
-    else:  # lookup_method == 'state_county'
-        #print("Using State and County Code for lookup")
-        query = f"""
-        SELECT 
-            Establishments_Small_Business_TILow_Inside,
-			Establishments_Small_Business_TIMod_Inside,
-			Establishments_Small_Business_Inside,
-			Establishments_GAR_Less_1M_Small_Business_Inside,
-			Establishments_GAR_1_to_250k_Small_Business_Inside,
-			Establishments_GAR_250k_to_1M_Small_Business_Inside,
-			Establishments_Small_Farm_TILow_Inside,
-			Establishments_Small_Farm_TIMod_Inside,
-			Establishments_Small_Farm_Inside,
-			Establishments_GAR_Less_1M_Small_Farm_Inside,
-			Establishments_GAR_1_to_250k_Small_Farm_Inside,
-			Establishments_GAR_250k_to_1M_Small_Farm_Inside,
-			Establishments_Small_Business_TILow,
-			Establishments_Small_Business_TIMod,
-			Establishments_Small_Business,
-			Establishments_GAR_Less_1M_Small_Business,
-			Establishments_GAR_1_to_250k_Small_Business,
-			Establishments_GAR_250k_to_1M_Small_Business,
-			Establishments_Small_Farm_TILow,
-			Establishments_Small_Farm_TIMod,
-			Establishments_Small_Farm,
-			Establishments_GAR_Less_1M_Small_Farm,
-			Establishments_GAR_1_to_250k_Small_Farm,
-			Establishments_GAR_250k_to_1M_Small_Farm,
-            State_Code,
-            County_Code
-        FROM Retail_Table 
-        WHERE 
-            id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-            AND ActivityYear = {selected_year} 
-            AND State_Code = {state_code} AND County_Code = {county_code};
-        """
-    # Create a Polars DataFrame
-    with engine.connect() as connection:
-        result = connection.execute(text(query))
-        rows = result.fetchall()
-        columns = result.keys()
+def fetch_loan_data_bor_income(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    return fetch_report(engine, 'bor_income', selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate)
 
-    # Create a list of dictionaries for constructing the DataFrame
-    data_dicts = [dict(zip(columns, row)) for row in rows]
+def fetch_loan_data_tract_income(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    return fetch_report(engine, 'tract_income', selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate)
 
-    # Debug: Print data_dicts
-    #print(f"Data Dicts: {data_dicts}")
+def fetch_loan_data_business(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    return fetch_report(engine, 'business', selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate)
 
-    # Create the Polars DataFrame
-    df = pl.DataFrame(data_dicts)
+def fetch_loan_business_size(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    return fetch_report(engine, 'business_size', selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate)
 
-    # Print the first few rows of the DataFrame
-    print(df.head())
+def fetch_demographics(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    return fetch_report(engine, 'demographics', selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate)
 
-    return df
+def fetch_bus_demographics(engine, selected_bank, selected_year, md_code, msa_code, selected_area, lookup_method, state_code, county_code, aggregate=False):
+    return fetch_report(engine, 'bus_demographics', selected_bank, selected_year, lookup_method, md_code, msa_code, state_code, county_code, aggregate)
 
 def fetch_loan_data_overall(engine, selected_bank, selected_year):
-
-    # Query the loan data for the selected bank and year from the Retail_Table
-    query = f"""
-    SELECT      
-		cra_current_year_assets,
-		cra_previous_year_assets,
-		hmda_assets,
-		number_of_branches,
-		bank_county_deposits,
-		Lender_in_CRA,
-		Lender_in_HMDA,
-		id_rssd,
-		Amt_Orig_SFam_Closed, 
-        Amt_Orig_SFam_Open, 
-        Amt_Orig_MFam, 
-        SF_Amt_Orig, 
-        SB_Amt_Orig,
-        SB_Loan_Orig,
-        SF_Loan_Orig, 
-        Amt_Orig,
-        Partial_Ind,
-		Loan_Orig_SFam_Closed_Inside, 
-        Loan_Orig_SFam_Open_Inside, 
-        Loan_Orig_MFam_Inside, 
-        SB_Loan_Orig_Inside, 
-        SF_Loan_Orig_Inside, 
-        Amt_Orig_SFam_Closed_Inside,
-        Amt_Orig_SFam_Open_Inside,
-        Amt_Orig_MFam_Inside,
-        SB_Amt_Orig_Inside,
-        SF_Amt_Orig_Inside,
-        Loan_Orig_SFam_Closed,
-        Loan_Orig_SFam_Open,
-        Loan_Orig_MFam,
-        Loan_Orig,
-		MSA_Code,
-		MD_Code,
-        State_Code,
-        County_Code
-		
-    FROM Retail_Table 
-    WHERE 
-        id_rssd = (SELECT id_rssd FROM PE_Table WHERE bank_name = '{selected_bank}') 
-        AND ActivityYear = {selected_year};
-    """
-    df = pl.read_database(query, engine)
-
-    # Print the first few rows of the DataFrame
-    print(df.head())
-
-    return df
\ No newline at end of file
+    # Every row of the bank-year, for the overall tables and the per-area rankings
+    query = bank_statement(f"SELECT {', '.join(report_columns['overall'])} FROM Retail_Table WHERE {bank_predicate};")
+    return run_query(engine, query, bank_params(engine, selected_bank, selected_year))
@@ -0,0 +1,30 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Threads rather than processes: the engine and store can't be pickled, and the SQLite
+# and Polars work that dominates a page runs without holding the GIL
+max_workers = int(os.environ.get('CRA_TASK_WORKERS', 8))
+
+def run_tasks(tasks, workers=None):
+    # Run {name: (function, [dependency names])} as soon as each task's dependencies are
+    # done, passing their results in order, and return {name: result} once all have finished.
+    # An error in any task is raised here after the tasks already running have stopped.
+    pending = dict(tasks)
+    results = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=workers or max_workers) as pool:
+        while pending or running:
+            for name, (function, dependencies) in list(pending.items()):
+                if all(dependency in results for dependency in dependencies):
+                    del pending[name]
+                    running[pool.submit(function, *(results[dependency] for dependency in dependencies))] = name
+
+            if not running:
+                raise ValueError(f"Tasks with unknown or circular dependencies: {', '.join(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+
+    return results